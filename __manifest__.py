@@ -34,13 +34,25 @@
     # always loaded
 
     'data': [
+        'security/ir.model.access.csv',
+        'data/res_users_data.xml',
+        'data/ir_cron.xml',
+        'data/invoice_template_data.xml',
         'reports/invoice.xml',
         'reports/nve_barcode.xml',
+        'reports/sequence_audit.xml',
         'views/sale_order_.xml',
         'views/stock_.xml',
         'views/account_journal_.xml',
         'views/account_move_.xml',
         'views/stock_quant_package_.xml',
+        'views/label_printer_.xml',
+        'views/accounting_export.xml',
+        'views/carrier_manifest.xml',
+        'views/document_trace.xml',
+        'views/package_archive.xml',
+        'views/invoice_template.xml',
+        'views/sequence_audit.xml',
     ],
 
 }
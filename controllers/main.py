@@ -0,0 +1,23 @@
+from odoo import http
+from odoo.http import request, content_disposition
+
+
+class AccountingExportController(http.Controller):
+
+    @http.route('/ngr_addon/accounting_export/<int:export_id>', type='http', auth='user')
+    def download_accounting_export(self, export_id, **kwargs):
+        """Stream the accounting export file without building it in memory."""
+        export = request.env['ngr.accounting.export'].browse(export_id).exists()
+        if not export:
+            return request.not_found()
+        export.check_access('read')
+
+        response = request.make_response(
+            export._stream_export(),
+            headers=[
+                ('Content-Type', f'text/csv; charset={export._get_encoding()}'),
+                ('Content-Disposition', content_disposition(export._get_filename())),
+            ],
+        )
+        response.direct_passthrough = True
+        return response
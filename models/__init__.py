@@ -5,4 +5,12 @@ from . import sale_order_
 from . import account_move_
 from . import stock_
 from . import stock_quant_package
-from . import stock_move_line_
\ No newline at end of file
+from . import stock_move_line_
+from . import label_printer
+from . import marketplace_return
+from . import accounting_export
+from . import carrier_manifest
+from . import document_trace
+from . import package_archive
+from . import invoice_template
+from . import sequence_audit
@@ -5,5 +5,5 @@ from odoo.exceptions import UserError
 class AccountMove(models.Model):
     _inherit = 'account.move'
     
-    picking_id = fields.Many2one('stock.picking',readonly=True)
+    picking_id = fields.Many2one('stock.picking',readonly=True, index='btree_not_null')
 
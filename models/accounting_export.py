@@ -0,0 +1,302 @@
+import csv
+import io
+
+from odoo import fields, models, api, _
+from odoo.exceptions import UserError, ValidationError
+
+from ..tools import open_read_cursor, replica_settings, stream_query
+
+
+class AccountingExport(models.TransientModel):
+    """
+    DATEV-style / CSV booking export of marketplace journals.
+
+    Moves and lines are never loaded into the ORM: the rows are read through a
+    server-side cursor in fixed-size chunks and written as a generator straight
+    to the HTTP response, so memory use does not depend on the number of rows.
+    """
+    _name = 'ngr.accounting.export'
+    _description = 'Accounting Export'
+
+    _export_chunk_size = 2000
+
+    # Columns of the DATEV Buchungsstapel (format 700, version 13), in format order
+    _DATEV_COLUMNS = [
+        'Umsatz (ohne Soll/Haben-Kz)', 'Soll/Haben-Kennzeichen', 'WKZ Umsatz', 'Kurs', 'Basis-Umsatz',
+        'WKZ Basis-Umsatz', 'Konto', 'Gegenkonto (ohne BU-Schlüssel)', 'BU-Schlüssel', 'Belegdatum',
+        'Belegfeld 1', 'Belegfeld 2', 'Skonto', 'Buchungstext', 'Postensperre', 'Diverse Adressnummer',
+        'Geschäftspartnerbank', 'Sachverhalt', 'Zinssperre', 'Beleglink',
+        *[column for index in range(1, 9) for column in (f'Beleginfo - Art {index}', f'Beleginfo - Inhalt {index}')],
+        'KOST1 - Kostenstelle', 'KOST2 - Kostenstelle', 'Kost-Menge', 'EU-Land u. UStID (Bestimmung)',
+        'EU-Steuersatz (Bestimmung)', 'Abw. Versteuerungsart', 'Sachverhalt L+L', 'Funktionsergänzung L+L',
+        'BU 49 Hauptfunktionstyp', 'BU 49 Hauptfunktionsnummer', 'BU 49 Funktionsergänzung',
+        *[column for index in range(1, 21)
+          for column in (f'Zusatzinformation - Art {index}', f'Zusatzinformation- Inhalt {index}')],
+        'Stück', 'Gewicht', 'Zahlweise', 'Forderungsart', 'Veranlagungsjahr', 'Zugeordnete Fälligkeit',
+        'Skontotyp', 'Auftragsnummer', 'Buchungstyp', 'USt-Schlüssel (Anzahlungen)',
+        'EU-Mitgliedstaat (Anzahlungen)', 'Sachverhalt L+L (Anzahlungen)', 'EU-Steuersatz (Anzahlungen)',
+        'Erlöskonto (Anzahlungen)', 'Herkunft-Kz', 'Buchungs GUID', 'KOST-Datum', 'SEPA-Mandatsreferenz',
+        'Skontosperre', 'Gesellschaftername', 'Beteiligtennummer', 'Identifikationsnummer', 'Zeichnernummer',
+        'Postensperre bis', 'Bezeichnung SoBil-Sachverhalt', 'Kennzeichen SoBil-Buchung', 'Festschreibung',
+        'Leistungsdatum', 'Datum Zuord. Steuerperiode', 'Fälligkeit', 'Generalumkehr (GU)', 'Steuersatz',
+        'Land', 'Abrechnungsreferenz', 'BVV-Position', 'EU-Land u. UStID (Ursprung)',
+        'EU-Steuersatz (Ursprung)', 'Abw. Skontokonto',
+    ]
+
+    journal_ids = fields.Many2many('account.journal', string='Journals', required=True,
+                                   domain=[('type', '=', 'sale')])
+    date_from = fields.Date(required=True)
+    date_to = fields.Date(required=True)
+    export_format = fields.Selection([
+        ('datev', 'DATEV (Buchungsstapel)'),
+        ('csv', 'CSV'),
+    ], default='datev', required=True)
+
+    _EXPORT_QUERY = """
+        SELECT am.name AS move_name,
+               am.move_type,
+               am.date,
+               am.invoice_date,
+               am.invoice_origin,
+               aj.code AS journal_code,
+               rp.name AS partner_name,
+               rp.lang AS partner_lang,
+               rp.vat AS partner_vat,
+               aml.name AS line_name,
+               aml.quantity,
+               aml.balance,
+               aml.price_subtotal,
+               aml.price_total,
+               cur.name AS currency,
+               aa.code_store->>(am.company_id::text) AS account_code,
+               counter.account_code AS counter_account_code,
+               taxes.tax_rate,
+               taxes.tax_names
+          FROM account_move_line aml
+          JOIN account_move am ON am.id = aml.move_id
+          JOIN account_journal aj ON aj.id = am.journal_id
+          JOIN account_account aa ON aa.id = aml.account_id
+          JOIN res_currency cur ON cur.id = aml.currency_id
+     LEFT JOIN res_partner rp ON rp.id = am.partner_id
+     LEFT JOIN LATERAL (
+                SELECT caa.code_store->>(am.company_id::text) AS account_code
+                  FROM account_move_line cl
+                  JOIN account_account caa ON caa.id = cl.account_id
+                 WHERE cl.move_id = am.id
+                   AND cl.display_type = 'payment_term'
+              ORDER BY cl.id
+                 LIMIT 1
+               ) counter ON TRUE
+     LEFT JOIN LATERAL (
+                SELECT MIN(tax.amount) AS tax_rate,
+                       string_agg(COALESCE(tax.name->>rp.lang, tax.name->>'en_US'), ', ' ORDER BY tax.sequence) AS tax_names
+                  FROM account_move_line_account_tax_rel rel
+                  JOIN account_tax tax ON tax.id = rel.account_tax_id
+                 WHERE rel.account_move_line_id = aml.id
+               ) taxes ON TRUE
+         WHERE am.journal_id = ANY(%(journal_ids)s)
+           AND am.state = 'posted'
+           AND am.move_type IN ('out_invoice', 'out_refund')
+           AND am.date BETWEEN %(date_from)s AND %(date_to)s
+           AND aml.display_type = 'product'
+      ORDER BY am.date, am.id, aml.id
+    """
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for export in self:
+            if export.date_from > export.date_to:
+                raise ValidationError(_('The start date must be before the end date.'))
+
+    def action_export(self):
+        """Download the export through the streaming controller."""
+        self.ensure_one()
+        if self.export_format == 'datev':
+            # Checked before the download starts, the file is streamed afterwards
+            self._get_datev_numbers()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/ngr_addon/accounting_export/{self.id}',
+            'target': 'self',
+        }
+
+    def _get_filename(self):
+        self.ensure_one()
+        codes = '_'.join(self.journal_ids.mapped('code'))
+        prefix = 'EXTF_Buchungsstapel' if self.export_format == 'datev' else 'bookings'
+        return f'{prefix}_{codes}_{self.date_from}_{self.date_to}.csv'
+
+    def _get_encoding(self):
+        # DATEV only imports ANSI (Windows-1252) files
+        return 'cp1252' if self.export_format == 'datev' else 'utf-8'
+
+    def _stream_export(self):
+        """
+        Return a generator producing the encoded export file chunk by chunk.
+
+        The generator opens its own cursor: it is consumed by the HTTP layer after
+        the request cursor has been closed. The cursor is opened on the read replica
+        when replica routing is enabled.
+
+        Returns:
+            generator: Encoded chunks of the export file.
+        """
+        self.ensure_one()
+        registry = self.env.registry
+        uid = self.env.uid
+        context = dict(self.env.context)
+        export_id = self.id
+        settings = replica_settings(self.env)
+
+        def generate():
+            with open_read_cursor(registry, settings) as cr:
+                export = api.Environment(cr, uid, context)[self._name].browse(export_id)
+                yield from export._iter_export_chunks(cr)
+
+        return generate()
+
+    def _iter_export_chunks(self, cr):
+        """
+        Yield the encoded header and row chunks of the export.
+
+        Args:
+            cr: The cursor used for the server-side cursor.
+        """
+        self.ensure_one()
+        encoding = self._get_encoding()
+        format_row = getattr(self, f'_format_{self.export_format}_row')
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=';', quoting=csv.QUOTE_MINIMAL, lineterminator='\r\n')
+        if self.export_format == 'datev':
+            buffer.write(self._get_datev_metadata_record())
+        writer.writerow(getattr(self, f'_get_{self.export_format}_header')())
+        yield self._flush(buffer, encoding)
+
+        params = {
+            'journal_ids': self.journal_ids.ids,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+        }
+        for rows in stream_query(cr, self._EXPORT_QUERY, params, self._export_chunk_size):
+            writer.writerows(format_row(row) for row in rows)
+            yield self._flush(buffer, encoding)
+
+    @staticmethod
+    def _flush(buffer, encoding):
+        data = buffer.getvalue().encode(encoding, errors='replace')
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    def _get_datev_metadata_record(self):
+        """
+        Return the EXTF header record DATEV expects before the column row.
+
+        Consultant and client number and the account length are taken from the system
+        parameters ``ngr_addon.datev_consultant_number``, ``ngr_addon.datev_client_number``
+        and ``ngr_addon.datev_account_length`` (default 4).
+        """
+        self.ensure_one()
+        params = self.env['ir.config_parameter'].sudo()
+        consultant_number, client_number = self._get_datev_numbers()
+        company = self.env.company
+        fiscal_year_start = company.compute_fiscalyear_dates(self.date_from)['date_from']
+        values = [
+            'EXTF', 700, 21, 'Buchungsstapel', 13,
+            fields.Datetime.now().strftime('%Y%m%d%H%M%S000'),
+            None, 'RE', (self.env.user.name or '')[:25], None,
+            consultant_number,
+            client_number,
+            fiscal_year_start.strftime('%Y%m%d'),
+            int(params.get_param('ngr_addon.datev_account_length', 4)),
+            self.date_from.strftime('%Y%m%d'),
+            self.date_to.strftime('%Y%m%d'),
+            ('Marketplace %s' % ','.join(self.journal_ids.mapped('code')))[:30],
+            None, 1, 0, 0, company.currency_id.name,
+            None, None, None, None, None, None, None, None, None,
+        ]
+        # Text fields are always quoted, numbers never
+        return ';'.join(
+            '' if value is None else f'"{value}"' if isinstance(value, str) else str(value)
+            for value in values
+        ) + '\r\n'
+
+    def _get_datev_numbers(self):
+        """
+        Return the DATEV consultant and client number.
+
+        Raises:
+            UserError: If one of the system parameters is not set, DATEV rejects number 0.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        consultant_number = params.get_param('ngr_addon.datev_consultant_number')
+        client_number = params.get_param('ngr_addon.datev_client_number')
+        if not (consultant_number and client_number):
+            raise UserError(_(
+                "Set the system parameters ngr_addon.datev_consultant_number and "
+                "ngr_addon.datev_client_number before exporting to DATEV."
+            ))
+        return int(consultant_number), int(client_number)
+
+    def _get_datev_header(self):
+        return self._DATEV_COLUMNS
+
+    def _format_datev_row(self, row):
+        """
+        Format a line as DATEV booking: gross amount booked from the customer
+        (receivable) account against the revenue account.
+
+        The row has every Buchungsstapel column, the unused ones are left empty.
+        """
+        values = self._get_datev_values(row)
+        return [values.get(column, '') for column in self._DATEV_COLUMNS]
+
+    def _get_datev_values(self, row):
+        amount = abs(row['price_total'] or 0.0)
+        # Revenue lines of invoices are credited, the customer is debited ('S')
+        indicator = 'S' if (row['balance'] or 0.0) <= 0 else 'H'
+        document_date = row['invoice_date'] or row['date']
+        return {
+            'Umsatz (ohne Soll/Haben-Kz)': ('%.2f' % amount).replace('.', ','),
+            'Soll/Haben-Kennzeichen': indicator,
+            'WKZ Umsatz': row['currency'],
+            'Konto': row['counter_account_code'] or '',
+            'Gegenkonto (ohne BU-Schlüssel)': row['account_code'] or '',
+            'Belegdatum': document_date.strftime('%d%m'),
+            'Belegfeld 1': (row['move_name'] or '')[:36],
+            'Belegfeld 2': (row['invoice_origin'] or '')[:12],
+            'Buchungstext': (row['line_name'] or row['partner_name'] or '')[:60],
+            'EU-Land u. UStID (Bestimmung)': row['partner_vat'] or '',
+            'EU-Steuersatz (Bestimmung)':
+                ('%.2f' % row['tax_rate']).replace('.', ',') if row['tax_rate'] is not None else '',
+        }
+
+    def _get_csv_header(self):
+        return [
+            'journal', 'move', 'move_type', 'date', 'invoice_date', 'origin', 'partner',
+            'partner_lang', 'partner_vat', 'label', 'quantity', 'account', 'counter_account',
+            'subtotal', 'total', 'currency', 'tax_rate', 'taxes',
+        ]
+
+    def _format_csv_row(self, row):
+        return [
+            row['journal_code'],
+            row['move_name'],
+            row['move_type'],
+            row['date'],
+            row['invoice_date'] or '',
+            row['invoice_origin'] or '',
+            row['partner_name'] or '',
+            row['partner_lang'] or '',
+            row['partner_vat'] or '',
+            row['line_name'] or '',
+            row['quantity'],
+            row['account_code'] or '',
+            row['counter_account_code'] or '',
+            row['price_subtotal'],
+            row['price_total'],
+            row['currency'],
+            row['tax_rate'] if row['tax_rate'] is not None else '',
+            row['tax_names'] or '',
+        ]
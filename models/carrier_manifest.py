@@ -0,0 +1,284 @@
+import base64
+import csv
+import io
+import tempfile
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from odoo import fields, models, api
+
+from ..tools import stream_query
+
+
+class DeliveryCarrier(models.Model):
+    _inherit = 'delivery.carrier'
+
+    manifest_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('edifact', 'EDIFACT'),
+    ], string='Manifest Format', default='csv',
+        help='File format of the end-of-day manifest sent to this carrier')
+    manifest_cutoff = fields.Datetime(
+        string='Manifested Up To', readonly=True, copy=False,
+        help='Packages shipped before this time have been considered by a manifest run')
+
+
+class CarrierManifest(models.Model):
+    """
+    End-of-day manifest of the NVE packages shipped with one carrier.
+
+    Every package is manifested once: packages are linked to their manifest,
+    so re-running the generation only picks up packages shipped since the last run.
+    """
+    _name = 'ngr.carrier.manifest'
+    _description = 'Carrier Manifest'
+    _order = 'date desc, id desc'
+
+    _manifest_chunk_size = 1000
+
+    # Packages validated in a transaction still open at the previous run are picked up by the next one
+    _manifest_overlap = timedelta(hours=1)
+
+    name = fields.Char(required=True, readonly=True)
+    carrier_id = fields.Many2one('delivery.carrier', required=True, readonly=True, index=True, ondelete='restrict')
+    date = fields.Date(required=True, readonly=True)
+    package_ids = fields.One2many('stock.quant.package', 'manifest_id', string='Packages', readonly=True)
+    package_count = fields.Integer(readonly=True)
+    total_weight = fields.Float(digits='Stock Weight', readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', string='Manifest File', readonly=True, ondelete='set null')
+
+    _MANIFEST_QUERY = """
+        SELECT pkg.id AS package_id,
+               pkg.name AS package_name,
+               pkg.nve,
+               pkg.tracking_ref,
+               COALESCE(NULLIF(pkg.shipping_weight, 0), SUM(quant.gross_weight), 0) AS gross_weight,
+               COALESCE(SUM(quant.net_weight), 0) AS net_weight,
+               sp.name AS picking_name,
+               sp.carrier_tracking_ref,
+               sp.date_done,
+               partner.name AS partner_name,
+               partner.street,
+               partner.street2,
+               partner.zip,
+               partner.city,
+               country.code AS country_code
+          FROM stock_picking sp
+          JOIN stock_picking_type spt ON spt.id = sp.picking_type_id
+          JOIN stock_quant_package pkg ON pkg.picking_id = sp.id
+     LEFT JOIN stock_quant quant ON quant.package_id = pkg.id
+     LEFT JOIN res_partner partner ON partner.id = sp.partner_id
+     LEFT JOIN res_country country ON country.id = partner.country_id
+         WHERE sp.state = 'done'
+           AND sp.carrier_id = %(carrier_id)s
+           AND sp.date_done >= %(date_start)s
+           AND sp.date_done < %(date_end)s
+           AND spt.code = 'outgoing'
+           AND pkg.manifest_id IS NULL
+      GROUP BY pkg.id, sp.id, partner.id, country.id
+      ORDER BY sp.id, pkg.id
+    """
+
+    @api.model
+    def _cron_generate_manifests(self):
+        self._generate_manifests(fields.Date.context_today(self))
+
+    @api.model
+    def _generate_manifests(self, date):
+        """
+        Create the manifests of every carrier with unmanifested packages shipped up to
+        the end of the given day (or now, if earlier).
+
+        Every carrier stores the upper bound of its last run in ``manifest_cutoff``,
+        which is the lower bound of the next one: packages shipped after the evening
+        run are manifested the next day. Carriers without previous run start at the
+        beginning of the day, so packages shipped before the module was installed
+        are never manifested.
+
+        Args:
+            date (date): The shipping day, in the timezone of the current user.
+
+        Returns:
+            ngr.carrier.manifest: The manifests created by this run.
+        """
+        day_start, day_end = self._get_day_bounds(date)
+        date_end = min(day_end, fields.Datetime.now())
+
+        # One range scan of the (carrier_id, date_done) index per carrier
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT dc.id
+              FROM delivery_carrier dc
+             WHERE EXISTS (
+                        SELECT 1
+                          FROM stock_picking sp
+                          JOIN stock_picking_type spt ON spt.id = sp.picking_type_id
+                          JOIN stock_quant_package pkg ON pkg.picking_id = sp.id
+                         WHERE sp.state = 'done'
+                           AND sp.carrier_id = dc.id
+                           AND sp.date_done >= COALESCE(dc.manifest_cutoff - %(overlap)s, %(day_start)s)
+                           AND sp.date_done < %(date_end)s
+                           AND spt.code = 'outgoing'
+                           AND pkg.manifest_id IS NULL
+                   )
+        """, {'overlap': self._manifest_overlap, 'day_start': day_start, 'date_end': date_end})
+        carriers = self.env['delivery.carrier'].browse(row[0] for row in self.env.cr.fetchall())
+
+        manifests = self.browse()
+        for carrier in carriers:
+            date_start = carrier.manifest_cutoff - self._manifest_overlap if carrier.manifest_cutoff else day_start
+            manifest = self.create({
+                'name': f'{carrier.name} {date}',
+                'carrier_id': carrier.id,
+                'date': date,
+            })
+            manifest._write_manifest(date_start, date_end)
+            if manifest.package_count:
+                manifests |= manifest
+            else:
+                manifest.unlink()
+
+        self.env['delivery.carrier'].with_context(active_test=False).search([
+            '|', ('manifest_cutoff', '=', False), ('manifest_cutoff', '<', date_end),
+        ]).manifest_cutoff = date_end
+        return manifests
+
+    def _get_day_bounds(self, date):
+        """Return the UTC datetimes delimiting the day in the user's timezone."""
+        tz = pytz.timezone(self.env.user.tz or 'UTC')
+        start = tz.localize(datetime.combine(date, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+        return start, start + timedelta(days=1)
+
+    def _write_manifest(self, date_start, date_end):
+        """
+        Stream the unmanifested packages shipped between date_start and date_end into
+        the manifest file.
+
+        Packages are read chunk by chunk through a server-side cursor; each chunk is
+        written to a temporary file and its packages are linked to this manifest.
+        """
+        self.ensure_one()
+        fmt = self.carrier_id.manifest_format or 'csv'
+        params = {
+            'carrier_id': self.carrier_id.id,
+            'date_start': date_start,
+            'date_end': date_end,
+        }
+        package_count = 0
+        total_weight = 0.0
+
+        with tempfile.TemporaryFile() as manifest_file:
+            manifest_file.write(getattr(self, f'_manifest_header_{fmt}')())
+            for rows in stream_query(self.env.cr, self._MANIFEST_QUERY, params, self._manifest_chunk_size):
+                manifest_file.write(getattr(self, f'_manifest_rows_{fmt}')(rows, package_count))
+                self.env.cr.execute(
+                    "UPDATE stock_quant_package SET manifest_id = %s WHERE id = ANY(%s)",
+                    [self.id, [row['package_id'] for row in rows]]
+                )
+                package_count += len(rows)
+                total_weight += sum(row['gross_weight'] for row in rows)
+            manifest_file.write(getattr(self, f'_manifest_footer_{fmt}')(package_count))
+
+            self.env['stock.quant.package'].invalidate_model(['manifest_id'])
+            if not package_count:
+                return
+
+            manifest_file.seek(0)
+            extension = 'csv' if fmt == 'csv' else 'edi'
+            attachment = self.env['ir.attachment'].create({
+                'name': f'manifest_{self.carrier_id.name}_{self.date}_{self.id}.{extension}',
+                'datas': base64.b64encode(manifest_file.read()),
+                'res_model': self._name,
+                'res_id': self.id,
+            })
+
+        self.write({
+            'package_count': package_count,
+            'total_weight': total_weight,
+            'attachment_id': attachment.id,
+        })
+
+    # CSV format
+
+    def _manifest_header_csv(self):
+        return self._csv_line([
+            'sscc', 'package', 'tracking_ref', 'delivery', 'shipped_at', 'gross_weight', 'net_weight',
+            'consignee', 'street', 'street2', 'zip', 'city', 'country',
+        ])
+
+    def _manifest_rows_csv(self, rows, offset):
+        return b''.join(self._csv_line([
+            row['nve'] or '',
+            row['package_name'],
+            row['tracking_ref'] or row['carrier_tracking_ref'] or '',
+            row['picking_name'],
+            row['date_done'],
+            '%.3f' % row['gross_weight'],
+            '%.3f' % row['net_weight'],
+            row['partner_name'] or '',
+            row['street'] or '',
+            row['street2'] or '',
+            row['zip'] or '',
+            row['city'] or '',
+            row['country_code'] or '',
+        ]) for row in rows)
+
+    def _manifest_footer_csv(self, package_count):
+        return b''
+
+    @staticmethod
+    def _csv_line(values):
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=';', lineterminator='\r\n').writerow(values)
+        return buffer.getvalue().encode('utf-8')
+
+    # EDIFACT format
+
+    # Segments of the message written per package (CNI, GIN, RFF, MEA, NAD)
+    _edifact_package_segments = 5
+
+    def _manifest_header_edifact(self):
+        now = fields.Datetime.now()
+        sender = self.env.company.partner_id.name
+        return self._edifact_segment(
+            'UNB', ('UNOC', '3'), sender, self.carrier_id.name, (now.strftime('%y%m%d'), now.strftime('%H%M')), self.id
+        ) + self._edifact_segment('UNH', self.id, ('IFCSUM', 'D', '04A', 'UN')) \
+            + self._edifact_segment('BGM', '610', self.name, '9')
+
+    def _manifest_rows_edifact(self, rows, offset):
+        return b''.join(
+            self._edifact_segment('CNI', index, row['picking_name'])
+            + self._edifact_segment('GIN', 'BJ', row['nve'] or row['package_name'])
+            + self._edifact_segment('RFF', ('CN', row['tracking_ref'] or row['carrier_tracking_ref'] or ''))
+            + self._edifact_segment('MEA', 'WT', 'AAB', ('KGM', '%.3f' % row['gross_weight']))
+            + self._edifact_segment('NAD', 'CN', '', '', row['partner_name'] or '', row['street'] or '',
+                                    row['city'] or '', '', row['zip'] or '', row['country_code'] or '')
+            for index, row in enumerate(rows, start=offset + 1)
+        )
+
+    def _manifest_footer_edifact(self, package_count):
+        # UNH, BGM, the package segments, CNT and UNT itself
+        segment_count = 2 + package_count * self._edifact_package_segments + 2
+        return self._edifact_segment('CNT', ('11', package_count)) \
+            + self._edifact_segment('UNT', segment_count, self.id) \
+            + self._edifact_segment('UNZ', 1, self.id)
+
+    def _edifact_segment(self, tag, *elements):
+        """
+        Build one EDIFACT segment.
+
+        Elements given as tuple are composite elements, their components are joined by ':'.
+        Reserved characters are escaped with the release character '?'.
+        """
+        parts = [tag]
+        for element in elements:
+            components = element if isinstance(element, tuple) else (element,)
+            parts.append(':'.join(self._edifact_escape(str(component)) for component in components))
+        return ('+'.join(parts) + "'\n").encode('utf-8')
+
+    @staticmethod
+    def _edifact_escape(value):
+        for char in "?+:'":
+            value = value.replace(char, '?' + char)
+        return value
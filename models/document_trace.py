@@ -0,0 +1,243 @@
+from odoo import fields, models, api, Command, _
+from odoo.exceptions import UserError
+
+from ..tools import replica_env
+
+
+class DocumentTrace(models.TransientModel):
+    """
+    Trace a document chain from any identifier.
+
+    An NVE, a carrier tracking reference, a custom invoice / credit note name,
+    a sale order name or a marketplace order reference is resolved to the whole
+    chain (sale order, journal, pickings, packages, invoices and credit notes)
+    with a single SQL query served by indexes on every join column.
+    """
+    _name = 'ngr.document.trace'
+    _description = 'Document Trace'
+
+    identifier = fields.Char(required=True, help='NVE, tracking reference, invoice name or (marketplace) order reference')
+    sale_order_ids = fields.Many2many('sale.order', string='Sales Orders', readonly=True)
+    picking_ids = fields.Many2many('stock.picking', string='Deliveries', readonly=True)
+    package_ids = fields.Many2many('stock.quant.package', string='Packages', readonly=True)
+    archived_package_ids = fields.Many2many('ngr.package.archive', string='Archived Packages', readonly=True)
+    invoice_ids = fields.Many2many('account.move', string='Invoices & Credit Notes', readonly=True)
+
+    _TRACE_QUERY = """
+        WITH seed_orders AS (
+                SELECT so.id
+                  FROM sale_order so
+                 WHERE so.name = %(identifier)s
+                    OR so.client_order_ref = %(identifier)s
+             UNION
+                SELECT sp.sale_id
+                  FROM stock_quant_package pkg
+                  JOIN stock_picking sp ON sp.id = pkg.picking_id
+                 WHERE pkg.nve = %(identifier)s
+                    OR pkg.tracking_ref = %(identifier)s
+             UNION
+                SELECT sp.sale_id
+                  FROM ngr_package_archive archive
+                  JOIN stock_picking sp ON sp.id = archive.picking_id
+                 WHERE archive.nve = %(identifier)s
+                    OR archive.tracking_ref = %(identifier)s
+             UNION
+                SELECT sp.sale_id
+                  FROM stock_picking sp
+                 WHERE sp.carrier_tracking_ref = %(identifier)s
+             UNION
+                SELECT sp.sale_id
+                  FROM account_move am
+                  JOIN stock_picking sp ON sp.id = am.picking_id
+                 WHERE am.name = %(identifier)s
+             UNION
+                SELECT sol.order_id
+                  FROM account_move am
+                  JOIN account_move_line aml ON aml.move_id = am.id
+                  JOIN sale_order_line_invoice_rel rel ON rel.invoice_line_id = aml.id
+                  JOIN sale_order_line sol ON sol.id = rel.order_line_id
+                 WHERE am.name = %(identifier)s
+        ),
+        order_pickings AS (
+                SELECT sp.*
+                  FROM stock_picking sp
+                 WHERE sp.sale_id IN (SELECT id FROM seed_orders)
+        ),
+        order_invoices AS (
+                SELECT aml.move_id AS id, sol.order_id
+                  FROM sale_order_line sol
+                  JOIN sale_order_line_invoice_rel rel ON rel.order_line_id = sol.id
+                  JOIN account_move_line aml ON aml.id = rel.invoice_line_id
+                 WHERE sol.order_id IN (SELECT id FROM seed_orders)
+             UNION
+                SELECT am.id, sp.sale_id
+                  FROM account_move am
+                  JOIN order_pickings sp ON sp.id = am.picking_id
+        )
+        SELECT json_build_object(
+                   'id', so.id,
+                   'name', so.name,
+                   'client_order_ref', so.client_order_ref,
+                   'market_place', so.market_place,
+                   'journal', CASE WHEN aj.id IS NULL THEN NULL ELSE json_build_object(
+                       'id', aj.id,
+                       'name', COALESCE(aj.name->>%(lang)s, aj.name->>'en_US'),
+                       'code', aj.code
+                   ) END,
+                   'pickings', COALESCE((
+                       SELECT json_agg(json_build_object(
+                                  'id', sp.id,
+                                  'name', sp.name,
+                                  'state', sp.state,
+                                  'date_done', sp.date_done,
+                                  'carrier_tracking_ref', sp.carrier_tracking_ref,
+                                  'packages', COALESCE((
+                                      SELECT json_agg(package ORDER BY package.id)
+                                        FROM (
+                                                SELECT pkg.id,
+                                                       pkg.name,
+                                                       pkg.nve,
+                                                       pkg.tracking_ref,
+                                                       weights.net_weight,
+                                                       weights.gross_weight,
+                                                       NULL::integer AS archive_id
+                                                  FROM stock_quant_package pkg
+                                             LEFT JOIN LATERAL (
+                                                        SELECT COALESCE(SUM(quant.net_weight), 0) AS net_weight,
+                                                               COALESCE(SUM(quant.gross_weight), 0) AS gross_weight
+                                                          FROM stock_quant quant
+                                                         WHERE quant.package_id = pkg.id
+                                                       ) weights ON TRUE
+                                                 WHERE pkg.picking_id = sp.id
+                                             UNION ALL
+                                                SELECT archive.package_id,
+                                                       archive.name,
+                                                       archive.nve,
+                                                       archive.tracking_ref,
+                                                       archive.net_weight,
+                                                       archive.gross_weight,
+                                                       archive.id
+                                                  FROM ngr_package_archive archive
+                                                 WHERE archive.picking_id = sp.id
+                                             ) package
+                                  ), '[]'::json)
+                              ) ORDER BY sp.id)
+                         FROM order_pickings sp
+                        WHERE sp.sale_id = so.id
+                   ), '[]'::json),
+                   'invoices', COALESCE((
+                       SELECT json_agg(json_build_object(
+                                  'id', am.id,
+                                  'name', am.name,
+                                  'move_type', am.move_type,
+                                  'state', am.state,
+                                  'payment_state', am.payment_state,
+                                  'invoice_date', am.invoice_date,
+                                  'amount_total', am.amount_total,
+                                  'picking_id', am.picking_id
+                              ) ORDER BY am.id)
+                         FROM order_invoices oi
+                         JOIN account_move am ON am.id = oi.id
+                        WHERE oi.order_id = so.id
+                          AND am.move_type IN ('out_invoice', 'out_refund')
+                   ), '[]'::json)
+               )
+          FROM sale_order so
+     LEFT JOIN account_journal aj ON aj.id = so.journal_id
+         WHERE so.id IN (SELECT id FROM seed_orders)
+      ORDER BY so.id
+    """
+
+    @api.model
+    def trace(self, identifier):
+        """
+        Return the whole document chain of an identifier in one round trip.
+
+        Args:
+            identifier (str): NVE, package or carrier tracking reference, custom invoice /
+                credit note name, sale order name or marketplace order reference.
+
+        Returns:
+            list: One dict per matching sale order with its marketplace, journal,
+                pickings (with packages, NVEs and weights) and invoices / credit notes
+                (with payment state). Archived packages carry their ``archive_id``.
+                Served by the read replica when replica routing is enabled. Records the
+                current user cannot read (access rights and record rules) are left out.
+        """
+        identifier = (identifier or '').strip()
+        if not identifier:
+            return []
+
+        self.env.flush_all()
+        with replica_env(self.env) as env:
+            env.cr.execute(self._TRACE_QUERY, {
+                'identifier': identifier,
+                'lang': self.env.lang or 'en_US',
+            })
+            orders = [row[0] for row in env.cr.fetchall()]
+        return self._filter_readable(orders)
+
+    @api.model
+    def _filter_readable(self, orders):
+        """Drop the records of the traced chain the current user is not allowed to read."""
+        pickings = [picking for order in orders for picking in order['pickings']]
+        packages = [package for picking in pickings for package in picking['packages']]
+        readable = {
+            'sale.order': self._get_readable_ids('sale.order', [order['id'] for order in orders]),
+            'account.journal': self._get_readable_ids(
+                'account.journal', [order['journal']['id'] for order in orders if order['journal']]),
+            'stock.picking': self._get_readable_ids('stock.picking', [picking['id'] for picking in pickings]),
+            'stock.quant.package': self._get_readable_ids(
+                'stock.quant.package', [package['id'] for package in packages if not package['archive_id']]),
+            'ngr.package.archive': self._get_readable_ids(
+                'ngr.package.archive', [package['archive_id'] for package in packages if package['archive_id']]),
+            'account.move': self._get_readable_ids(
+                'account.move', [invoice['id'] for order in orders for invoice in order['invoices']]),
+        }
+
+        result = []
+        for order in orders:
+            if order['id'] not in readable['sale.order']:
+                continue
+            if order['journal'] and order['journal']['id'] not in readable['account.journal']:
+                order['journal'] = None
+            order['pickings'] = [picking for picking in order['pickings'] if picking['id'] in readable['stock.picking']]
+            for picking in order['pickings']:
+                picking['packages'] = [
+                    package for package in picking['packages']
+                    if package['archive_id'] in readable['ngr.package.archive']
+                    or (not package['archive_id'] and package['id'] in readable['stock.quant.package'])
+                ]
+            order['invoices'] = [invoice for invoice in order['invoices'] if invoice['id'] in readable['account.move']]
+            result.append(order)
+        return result
+
+    def _get_readable_ids(self, model, ids):
+        Model = self.env[model].with_context(active_test=False)
+        if not ids or not Model.has_access('read'):
+            return set()
+        return set(Model.search([('id', 'in', ids)]).ids)
+
+    def action_trace(self):
+        """Fill the wizard with the records of the traced chain."""
+        self.ensure_one()
+        orders = self.trace(self.identifier)
+        if not orders:
+            raise UserError(_("Nothing found for '%s'.", self.identifier))
+
+        pickings = [picking for order in orders for picking in order['pickings']]
+        packages = [package for picking in pickings for package in picking['packages']]
+        self.write({
+            'sale_order_ids': [Command.set([order['id'] for order in orders])],
+            'picking_ids': [Command.set([picking['id'] for picking in pickings])],
+            'package_ids': [Command.set([package['id'] for package in packages if not package['archive_id']])],
+            'archived_package_ids': [Command.set([package['archive_id'] for package in packages if package['archive_id']])],
+            'invoice_ids': [Command.set([invoice['id'] for order in orders for invoice in order['invoices']])],
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -0,0 +1,114 @@
+from odoo import fields, models, api, tools
+
+
+class InvoiceTemplate(models.Model):
+    """
+    Language-specific label set of the invoice report.
+
+    One record per company and language holds every label, company footer and
+    closing text printed on invoices and credit notes. Label sets are compiled
+    once per (company, language) into a process-level cache that is cleared on
+    every change, so rendering a batch never rebuilds them.
+    """
+    _name = 'ngr.invoice.template'
+    _description = 'Invoice Template'
+    _order = 'company_id, lang'
+
+    company_id = fields.Many2one('res.company', required=True, default=lambda self: self.env.company)
+    lang = fields.Selection(selection='_get_languages', string='Language', required=True)
+
+    invoice_title = fields.Char(required=True)
+    credit_note_title = fields.Char(required=True)
+    tax_number = fields.Char(help='Tax number line printed in the header')
+    vat_number = fields.Char(help='VAT ID line printed in the header')
+
+    invoice_date_label = fields.Char(required=True)
+    credit_note_date_label = fields.Char(required=True)
+    order_number_label = fields.Char(required=True)
+    order_date_label = fields.Char(required=True)
+    delivery_label = fields.Char(required=True)
+
+    header_position = fields.Char(required=True)
+    header_quantity = fields.Char(required=True)
+    header_unit = fields.Char(required=True)
+    header_description = fields.Char(required=True)
+    header_unit_price = fields.Char(required=True)
+    header_total_price = fields.Char(required=True)
+
+    total_net_label = fields.Char(required=True)
+    total_tax_label = fields.Char(required=True)
+    total_gross_label = fields.Char(required=True)
+
+    footer_left = fields.Text(help='Left footer column, one line per row')
+    footer_center = fields.Text(help='Center footer column, one line per row')
+    footer_right = fields.Text(help='Right footer column, one line per row')
+
+    payment_text = fields.Char(help='Closing text of invoices, {date} is replaced by the payment date')
+    credit_text = fields.Char(help='Closing text of credit notes, {date} is replaced by the credit note date')
+
+    _sql_constraints = [
+        ('company_lang_unique', 'unique (company_id, lang)', "There is already an invoice template for this language."),
+    ]
+
+    @api.model
+    def _get_languages(self):
+        # Inactive languages are allowed so templates can be prepared before activation
+        return [(lang.code, lang.name) for lang in self.env['res.lang'].with_context(active_test=False).search([])]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache('company_id', 'lang')
+    def _get_compiled_template(self, company_id, lang):
+        """
+        Return the compiled label set of a company and language.
+
+        Falls back to the company's English template. Templates of other companies are
+        never used: they carry that company's tax number, VAT ID and bank details.
+
+        Returns:
+            dict: The label set in the structure used by the invoice report, or None.
+                The result is shared by the cache and must not be modified.
+        """
+        templates = self.sudo()
+        template = (
+            templates.search([('company_id', '=', company_id), ('lang', '=', lang)], limit=1)
+            or templates.search([('company_id', '=', company_id), ('lang', '=', 'en_US')], limit=1)
+        )
+        return template._compile() if template else None
+
+    def _compile(self):
+        self.ensure_one()
+
+        def lines(text):
+            return tuple(line for line in (text or '').splitlines() if line.strip())
+
+        return {
+            'title': (self.invoice_title, self.credit_note_title, self.tax_number or '', self.vat_number or ''),
+            'invoice_details': (self.invoice_date_label, self.credit_note_date_label, self.order_number_label,
+                                self.order_date_label, self.delivery_label),
+            'headers': (self.header_position, self.header_quantity, self.header_unit, self.header_description,
+                        self.header_unit_price, self.header_total_price),
+            'totals': (self.total_net_label, self.total_tax_label, self.total_gross_label),
+            'footer_company': {
+                'left': lines(self.footer_left),
+                'center': lines(self.footer_center),
+                'right': lines(self.footer_right),
+            },
+            'payment_text': self.payment_text or '',
+            'credit_text': self.credit_text or '',
+        }
@@ -0,0 +1,220 @@
+import logging
+import socket
+from datetime import timedelta
+
+from odoo import fields, models, api, _
+from odoo.tools.sql import create_index
+
+_logger = logging.getLogger(__name__)
+
+
+class LabelPrinter(models.Model):
+    """
+    Raw socket label printer of a packing station.
+
+    Labels are sent as ZPL over a plain TCP connection (port 9100 style),
+    which every common thermal label printer understands.
+    """
+    _name = 'ngr.label.printer'
+    _description = 'Label Printer'
+    _order = 'name'
+
+    name = fields.Char(required=True)
+    active = fields.Boolean(default=True)
+    host = fields.Char(required=True, help='Hostname or IP address of the printer')
+    port = fields.Integer(default=9100, required=True, help='Raw printing port of the printer')
+    timeout = fields.Float(default=10.0, help='Connection timeout in seconds')
+    batch_size = fields.Integer(default=50, help='Maximum number of labels sent over one connection')
+    max_attempts = fields.Integer(default=5, help='Number of attempts before a label job is marked as failed')
+
+    def _send_raw(self, payloads):
+        """
+        Send several label payloads to the printer over a single connection.
+
+        Args:
+            payloads (list): Encoded label payloads (bytes).
+
+        Raises:
+            OSError: If the printer cannot be reached or the connection breaks.
+        """
+        self.ensure_one()
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as connection:
+            connection.sendall(b''.join(payloads))
+
+
+class LabelPrintJob(models.Model):
+    """
+    Spooled NVE label waiting to be printed.
+
+    Jobs are queued during delivery validation and sent by a background cron,
+    so validating a picking never waits on a printer.
+    """
+    _name = 'ngr.label.print.job'
+    _description = 'Label Print Job'
+    _order = 'id'
+
+    printer_id = fields.Many2one('ngr.label.printer', required=True, index=True, ondelete='cascade')
+    picking_id = fields.Many2one('stock.picking', string='Delivery', required=True, ondelete='cascade')
+    package_id = fields.Many2one('stock.quant.package', string='Package', required=True, ondelete='cascade')
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ], default='queued', required=True, index=True)
+    attempts = fields.Integer(readonly=True)
+    next_attempt_date = fields.Datetime(readonly=True, help='Earliest time of the next attempt after a failure')
+    sent_date = fields.Datetime(readonly=True)
+    last_error = fields.Text(readonly=True)
+
+    def init(self):
+        super().init()
+        create_index(
+            self.env.cr,
+            'ngr_label_print_job_queued_index',
+            self._table,
+            ['printer_id', 'id'],
+            where="state = 'queued'",
+        )
+
+    @api.model
+    def _enqueue_picking_labels(self, picking):
+        """
+        Queue one label job per result package of the picking that has an NVE.
+
+        Packages without NVE (e.g. the warehouse NVE settings are incomplete)
+        are skipped: their label would carry an empty SSCC.
+
+        Args:
+            picking: The validated stock.picking record.
+
+        Returns:
+            ngr.label.print.job: The created jobs.
+        """
+        printer = picking.picking_type_id.label_printer_id
+        packages = picking.result_packages.filtered('nve')
+        if not printer or not packages:
+            return self.browse()
+
+        jobs = self.create([{
+            'printer_id': printer.id,
+            'picking_id': picking.id,
+            'package_id': package.id,
+        } for package in packages])
+
+        # Wake up the spooler once this transaction is committed
+        self.env.ref('ngr_addon.ir_cron_process_label_print_jobs')._trigger()
+        return jobs
+
+    def action_retry(self):
+        """Queue failed or waiting jobs again right away; sent jobs are left alone."""
+        self.filtered(lambda job: job.state in ('failed', 'queued')).write({'state': 'queued', 'attempts': 0, 'next_attempt_date': False, 'last_error': False})
+        self.env.ref('ngr_addon.ir_cron_process_label_print_jobs')._trigger()
+
+    @api.model
+    def _cron_process_jobs(self):
+        """
+        Send queued labels printer by printer.
+
+        Each printer receives its labels in batches of ``batch_size`` over one
+        connection. Rows are locked with SKIP LOCKED so concurrent spooler runs
+        never send the same label twice. Every batch is committed on its own.
+        """
+        printers = self.env['ngr.label.printer'].search([])
+        for printer in printers:
+            while self._process_printer_batch(printer):
+                if not self.env.registry.in_test_mode():
+                    self.env.cr.commit()
+
+    def _process_printer_batch(self, printer):
+        """
+        Lock and send the next batch of queued labels of one printer.
+
+        Returns:
+            bool: True if a batch was sent successfully and more work may exist.
+        """
+        self.flush_model(['printer_id', 'state', 'next_attempt_date'])
+        self.env.cr.execute("""
+            SELECT id
+              FROM ngr_label_print_job
+             WHERE state = 'queued'
+               AND printer_id = %s
+               AND (next_attempt_date IS NULL OR next_attempt_date <= NOW() AT TIME ZONE 'UTC')
+          ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [printer.id, max(printer.batch_size, 1)])
+        jobs = self.browse(row[0] for row in self.env.cr.fetchall())
+        if not jobs:
+            return False
+
+        try:
+            printer._send_raw([job._render_zpl() for job in jobs])
+        except OSError as e:
+            _logger.warning("Label printer %s (%s:%s) failed: %s", printer.name, printer.host, printer.port, e)
+            jobs._register_failure(str(e))
+            return False
+
+        jobs.write({
+            'state': 'sent',
+            'sent_date': fields.Datetime.now(),
+            'last_error': False,
+        })
+        return True
+
+    def _register_failure(self, error):
+        """Increase the attempt counter and back off, or give up after max_attempts."""
+        now = fields.Datetime.now()
+        for job in self:
+            attempts = job.attempts + 1
+            if attempts >= job.printer_id.max_attempts:
+                job.write({'state': 'failed', 'attempts': attempts, 'last_error': error})
+            else:
+                job.write({
+                    'attempts': attempts,
+                    'last_error': error,
+                    'next_attempt_date': now + timedelta(minutes=2 ** attempts),
+                })
+
+    def _render_zpl(self):
+        """
+        Render the NVE label of the job as ZPL.
+
+        The NVE is printed as a GS1-128 barcode with application identifier (00).
+
+        Returns:
+            bytes: The UTF-8 encoded ZPL label.
+        """
+        self.ensure_one()
+        sender = self.picking_id.company_id.partner_id
+        recipient = self.picking_id.partner_id
+
+        def clean(value):
+            # ^ and ~ are ZPL control characters
+            return (value or '').replace('^', ' ').replace('~', ' ')
+
+        lines = [
+            '^XA',
+            '^CI28',
+            '^FO30,30^A0N,24,24^FD%s^FS' % clean(_('Sender')),
+            '^FO30,60^A0N,28,28^FD%s^FS' % clean(sender.name),
+            '^FO30,95^A0N,24,24^FD%s %s %s^FS' % (clean(sender.street), clean(sender.zip), clean(sender.city)),
+            '^FO30,150^A0N,24,24^FD%s^FS' % clean(_('Recipient')),
+            '^FO30,180^A0N,32,32^FD%s^FS' % clean(recipient.name),
+            '^FO30,220^A0N,28,28^FD%s^FS' % clean(recipient.street),
+            '^FO30,255^A0N,28,28^FD%s %s^FS' % (clean(recipient.zip), clean(recipient.city)),
+            '^FO30,290^A0N,28,28^FD%s^FS' % clean(recipient.country_id.name),
+            '^FO30,350^A0N,28,28^FD%s / %s^FS' % (clean(self.picking_id.name), clean(self.package_id.name)),
+            '^FO50,420^BY3^BCN,200,Y,N,N,D^FD(00)%s^FS' % clean(self.package_id.nve),
+            '^XZ',
+        ]
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+class StockPickingType(models.Model):
+    _inherit = 'stock.picking.type'
+
+    label_printer_id = fields.Many2one(
+        'ngr.label.printer',
+        string='Label Printer',
+        help='Printer of the packing station that receives the NVE labels of validated deliveries'
+    )
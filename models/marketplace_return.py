@@ -0,0 +1,226 @@
+from collections import defaultdict
+
+from odoo import fields, models, api, Command, _
+from odoo.exceptions import UserError
+
+
+class MarketplaceReturn(models.AbstractModel):
+    """
+    Batch processing of marketplace return files (Amazon, OTTO, ...).
+
+    A whole return file is processed in a handful of grouped operations:
+    one search per reference type, one create for all return pickings,
+    one create for all credit notes (numbered with one sequence reservation
+    per journal) and one bulk unpack of the returned packages.
+    """
+    _name = 'ngr.marketplace.return'
+    _description = 'Marketplace Returns Processing'
+
+    @api.model
+    def process_returns(self, return_lines):
+        """
+        Create return pickings and credit notes for a batch of marketplace returns.
+
+        Args:
+            return_lines (list): One dict per returned line with the keys
+                - order_ref: marketplace order reference (``client_order_ref``) or sale order name
+                - product: product barcode or internal reference
+                - quantity: returned quantity
+                - package: NVE or package name the goods came back in (optional)
+
+        Returns:
+            dict: ``pickings`` (done return pickings) and ``refunds`` (posted credit notes).
+
+        Raises:
+            UserError: If an order, product or package reference cannot be resolved,
+                or a product was never delivered for the order.
+        """
+        if not return_lines:
+            return {'pickings': self.env['stock.picking'], 'refunds': self.env['account.move']}
+
+        orders, products, packages = self._resolve_return_references(return_lines)
+
+        # Group the lines by the original delivery they are returned from
+        lines_by_picking = defaultdict(list)
+        for line in return_lines:
+            order = orders[line['order_ref']]
+            product = products[line['product']]
+            package = packages.get(line.get('package'))
+            origin_move = self._find_origin_move(order, product, package)
+            lines_by_picking[origin_move.picking_id].append({
+                'order': order,
+                'origin_move': origin_move,
+                'quantity': line['quantity'],
+                'package': package,
+            })
+
+        origin_pickings = list(lines_by_picking)
+        pickings = self.env['stock.picking'].create([
+            self._prepare_return_picking_vals(picking, lines_by_picking[picking])
+            for picking in origin_pickings
+        ])
+        pickings.action_confirm()
+        pickings._action_done()
+
+        refund_vals_list = [
+            self._prepare_refund_vals(origin_picking, return_picking, lines_by_picking[origin_picking])
+            for origin_picking, return_picking in zip(origin_pickings, pickings)
+        ]
+        refunds = self.env['account.move'].create([vals for vals in refund_vals_list if vals])
+        refunds.action_post()
+
+        returned_packages = self.env['stock.quant.package'].union(*packages.values())
+        if returned_packages:
+            returned_packages.unpack()
+
+        return {'pickings': pickings, 'refunds': refunds}
+
+    def _resolve_return_references(self, return_lines):
+        """
+        Resolve orders, products and packages of the whole batch with one search each.
+
+        Returns:
+            tuple: Three dicts mapping the references of the file to their records.
+        """
+        order_refs = {line['order_ref'] for line in return_lines}
+        product_refs = {line['product'] for line in return_lines}
+        package_refs = {line['package'] for line in return_lines if line.get('package')}
+
+        orders = {}
+        for order in self.env['sale.order'].search([
+            '|', ('client_order_ref', 'in', list(order_refs)), ('name', 'in', list(order_refs))
+        ]):
+            # The marketplace reference wins over the internal order name
+            if order.name in order_refs:
+                orders.setdefault(order.name, order)
+            if order.client_order_ref in order_refs:
+                orders[order.client_order_ref] = order
+
+        products = {}
+        for product in self.env['product.product'].search([
+            '|', ('barcode', 'in', list(product_refs)), ('default_code', 'in', list(product_refs))
+        ]):
+            if product.default_code in product_refs:
+                products.setdefault(product.default_code, product)
+            if product.barcode in product_refs:
+                products[product.barcode] = product
+
+        packages = {}
+        if package_refs:
+            for package in self.env['stock.quant.package'].search([
+                '|', ('nve', 'in', list(package_refs)), ('name', 'in', list(package_refs))
+            ]):
+                if package.name in package_refs:
+                    packages.setdefault(package.name, package)
+                if package.nve in package_refs:
+                    packages[package.nve] = package
+
+        missing = sorted(order_refs - set(orders)) + sorted(product_refs - set(products)) \
+            + sorted(package_refs - set(packages))
+        if missing:
+            raise UserError(_("The following references could not be found: %s", ', '.join(missing)))
+
+        return orders, products, packages
+
+    def _find_origin_move(self, order, product, package):
+        """Return the done outgoing move of the order that delivered the product."""
+        moves = order.picking_ids.filtered(
+            lambda picking: picking.picking_type_code == 'outgoing' and picking.state == 'done'
+        ).move_ids.filtered(lambda move: move.product_id == product and move.state == 'done')
+
+        if package and package.picking_id:
+            moves = moves.filtered(lambda move: move.picking_id == package.picking_id) or moves
+
+        if not moves:
+            raise UserError(_("Product %(product)s was not delivered for order %(order)s.",
+                              product=product.display_name, order=order.name))
+        return moves[0]
+
+    def _prepare_return_picking_vals(self, picking, lines):
+        """Prepare a done-ready return picking for the lines returned from one delivery."""
+        picking_type = picking.picking_type_id.return_picking_type_id or picking.picking_type_id
+        location = picking.location_dest_id
+        location_dest = picking_type.default_location_dest_id or picking.location_id
+
+        moves = []
+        for line in lines:
+            origin_move = line['origin_move']
+            package = line['package']
+            moves.append(Command.create({
+                'name': origin_move.name,
+                'product_id': origin_move.product_id.id,
+                'product_uom_qty': line['quantity'],
+                'product_uom': origin_move.product_uom.id,
+                'location_id': location.id,
+                'location_dest_id': location_dest.id,
+                'origin_returned_move_id': origin_move.id,
+                'sale_line_id': origin_move.sale_line_id.id,
+                'to_refund': True,
+                'picked': True,
+                'move_line_ids': [Command.create({
+                    'product_id': origin_move.product_id.id,
+                    'product_uom_id': origin_move.product_uom.id,
+                    'quantity': line['quantity'],
+                    'location_id': location.id,
+                    'location_dest_id': location_dest.id,
+                    'package_id': package.id if package else False,
+                    'result_package_id': package.id if package else False,
+                    'picked': True,
+                })],
+            }))
+
+        return {
+            'picking_type_id': picking_type.id,
+            'partner_id': picking.partner_id.id,
+            'origin': _("Return of %s", picking.name),
+            'return_id': picking.id,
+            'location_id': location.id,
+            'location_dest_id': location_dest.id,
+            'move_ids': moves,
+        }
+
+    def _prepare_refund_vals(self, origin_picking, return_picking, lines):
+        """
+        Prepare the credit note of one return picking.
+
+        The credit note uses the marketplace journal of the order, so its name is built
+        from the journal's ``credit_note_name`` prefix and custom sequence.
+        """
+        order = lines[0]['order']
+        invoice = order.invoice_ids.filtered(
+            lambda move: move.move_type == 'out_invoice' and move.state == 'posted'
+        )[:1]
+        journal = order.journal_id or invoice.journal_id
+        if not journal:
+            return False
+
+        invoice_lines = []
+        for line in lines:
+            sale_line = line['origin_move'].sale_line_id
+            if not sale_line:
+                continue
+            invoice_lines.append(Command.create({
+                'name': sale_line.name,
+                'product_id': sale_line.product_id.id,
+                'product_uom_id': sale_line.product_uom.id,
+                'quantity': line['quantity'],
+                'price_unit': sale_line.price_unit,
+                'discount': sale_line.discount,
+                'tax_ids': [Command.set(sale_line.tax_id.ids)],
+                'sale_line_ids': [Command.link(sale_line.id)],
+            }))
+        if not invoice_lines:
+            return False
+
+        return {
+            'move_type': 'out_refund',
+            'journal_id': journal.id,
+            'partner_id': order.partner_invoice_id.id,
+            'currency_id': order.currency_id.id,
+            'fiscal_position_id': order.fiscal_position_id.id,
+            'invoice_origin': order.name,
+            'invoice_date': fields.Date.context_today(self),
+            'reversed_entry_id': invoice.id,
+            'picking_id': return_picking.id,
+            'invoice_line_ids': invoice_lines,
+        }
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, _
 from odoo.tools import format_datetime, format_date, formatLang
 from odoo.exceptions import UserError
+from odoo.tools.sql import create_index
 
 
 class AccountMove(models.Model):
@@ -62,90 +63,29 @@ class AccountMove(models.Model):
     def get_invoice_template_based_on_lang(self):
         """
         Returns the invoice template based on the customer's language.
-        
+
+        The label set comes from the cached ngr.invoice.template of the invoice's company
+        and the customer's language; only the payment / credit texts are built per invoice.
+
         Returns:
             dict: Template data including titles, headers, footer, and payment text.
         """
+        self.ensure_one()
         payment_date = (self.get_invoice_paid_date()
                        if self.matched_payment_ids
                        else self.get_invoice_date())
         invoice_date = self.get_invoice_date()
 
-        templates = {
-            'de_DE': {
-                'title' : ['Rechnung','Gutschrift','Steuer-Nr. 44/663/70421','Ust-IdNr. DE452204311'],
-                'invoice_details' : ['Rechnungsdatum','Gutschriftsdatum' , 'Bestellungs-Nr' , 'Bestelldatum','Lieferung'],
-                'headers': ['Pos.', 'Anzahl', 'Einheit', 'Bezeichnung', 'Einzelpreis', 'Gesamtpreis'],
-                'totals': ['Gesamt Netto', 'Zzgl.MwSt.', 'Gesamt Brutto:'],
-                'footer_company': {
-                    'left': [
-                        'Sitz der Gesellschaft: Nackenheim',
-                        'Amtsgericht Mainz, HRB 53400'
-                    ],
-                    'center': [
-                        'Ust-IdNr DE452204311',
-                        'Steuer-Nr. 44/663/70421'
-                    ],
-                    'right': [
-                        'Bankverbindung: Commerzbank',
-                        'IBAN: DE26 5084 0005 0604 5702 00',
-                        'BIC: COBADEFFXXX'
-                    ]
-                },
-                'payment_text': f'Die Rechnung wurde am {payment_date} bezahlt.',
-                'credit_text': f'Die Gutschrift wurde am {invoice_date} gebucht.'
-            },
-            'en_US': {
-                'title': ['Invoice', 'Credit Note','Tax Number: 44/663/70421','VAT ID No.: DE452204311'],
-                'invoice_details': ['Invoice Date', 'Credit Note Date', 'Order Number', 'Order Date','Delivery'],
-                'headers': ['No.', 'Quantity', 'Unit', 'Description', 'Unit Price', 'Total Price'],
-                'totals': ['Total net', 'Plus VAT', 'Total gross:'],
-                'footer_company': {
-                    'left': [
-                        'Registered Office: Nackenheim',
-                        'Commercial Register: Mainz, HRB 53400'
-                    ],
-                    'center': [
-                        'VAT ID No.: DE452204311',
-                        'Tax Number: 44/663/70421'
-                    ],
-                    'right': [
-                        'Bank Details: Commerzbank',
-                        'IBAN: DE26 5084 0005 0604 5702 00',
-                        'BIC: COBADEFFXXX'
-                    ]
-                },
-                'payment_text': f'The invoice was paid on {payment_date}.',
-                'credit_text': f'The credit note was posted on {invoice_date}.'
-            },
-
-             'en_GB': {
-                'title': ['Invoice', 'Credit Note','Tax Number: 44/663/70421','VAT ID No.: DE452204311'],
-                'invoice_details': ['Invoice Date', 'Credit Note Date', 'Order Number', 'Order Date','Delivery'],
-                'headers': ['No.', 'Quantity', 'Unit', 'Description', 'Unit Price', 'Total Price'],
-                'totals': ['Total net', 'Plus VAT', 'Total gross:'],
-                'footer_company': {
-                    'left': [
-                        'Registered Office: Nackenheim',
-                        'Commercial Register: Mainz, HRB 53400'
-                    ],
-                    'center': [
-                        'VAT ID No.: DE452204311',
-                        'Tax Number: 44/663/70421'
-                    ],
-                    'right': [
-                        'Bank Details: Commerzbank',
-                        'IBAN: DE26 5084 0005 0604 5702 00',
-                        'BIC: COBADEFFXXX'
-                    ]
-                },
-                'payment_text': f'The invoice was paid on {payment_date}.',
-                'credit_text': f'The credit note was posted on {invoice_date}.'
-            }
-        }
-
         lang = self.partner_id.lang or 'en_US'
-        return templates.get(lang, templates['en_US'])
+        template = self.env['ngr.invoice.template']._get_compiled_template(self.company_id.id, lang)
+        if not template:
+            raise UserError(_("No invoice template is configured for the company %s.", self.company_id.name))
+
+        return dict(
+            template,
+            payment_text=template['payment_text'].replace('{date}', payment_date or ''),
+            credit_text=template['credit_text'].replace('{date}', invoice_date or ''),
+        )
 
     def get_invoice_date(self):
         """
@@ -188,14 +128,78 @@ class AccountMove(models.Model):
         Returns:
             str: The formatted price of the item including tax.
         """
-        if not line.tax_ids:
-            return self.get_formatted_amount(line.price_unit)
+        tax_rate = line.tax_ids[0].amount if line.tax_ids else None
+        return self.get_formatted_amount(self._price_with_tax(line.price_unit, tax_rate))
+
+    @api.model
+    def _price_with_tax(self, price_unit, tax_rate):
+        """Return the unit price including the (first) tax rate, unchanged without tax."""
+        if tax_rate is None:
+            return price_unit
+        tax_amount = round(tax_rate * price_unit / 100, 2)
+        return round(price_unit + tax_amount, 2)
+
+    # Marketplace invoices waiting for the posting worker of their journal
+    marketplace_post_pending = fields.Boolean(copy=False, readonly=True)
+
+    _marketplace_posting_batch_size = 100
+
+    def init(self):
+        super().init()
+        create_index(
+            self.env.cr,
+            'account_move_marketplace_post_pending_index',
+            self._table,
+            ['journal_id', 'id'],
+            where='marketplace_post_pending',
+        )
+        # Exact name lookups of the document trace, for drafts and posted moves alike
+        create_index(self.env.cr, 'account_move_name_btree_index', self._table, ['name'])
+
+    def _schedule_marketplace_posting(self):
+        """
+        Queue the invoices for posting instead of posting them in the current request.
+
+        Each journal has its own posting worker, so invoices of different marketplaces
+        are posted in parallel. The invoice numbers are already assigned at creation.
+        """
+        if not self:
+            return
+        self.write({'marketplace_post_pending': True})
+        for journal in self.journal_id:
+            journal._get_posting_cron()._trigger()
 
-        tax_rate = line.tax_ids[0].amount
-        tax_amount = round(tax_rate * line.price_unit / 100, 2)
-        price_with_tax = round(line.price_unit + tax_amount, 2)
+    @api.model
+    def _cron_post_marketplace_invoices(self, journal_id):
+        """
+        Post the pending marketplace invoices of one journal in creation order.
 
-        return self.get_formatted_amount(price_with_tax)
+        Invoices are posted in committed batches. An invoice that fails to post is left
+        in draft with the error on its chatter, so it never blocks the rest of the queue.
+
+        Args:
+            journal_id (int): The journal whose invoices are posted.
+        """
+        self = self.with_company(self.env['account.journal'].browse(journal_id).company_id)
+        while True:
+            moves = self.search([
+                ('marketplace_post_pending', '=', True),
+                ('journal_id', '=', journal_id),
+            ], order='id', limit=self._marketplace_posting_batch_size)
+            if not moves:
+                break
+
+            for move in moves:
+                if move.state == 'draft':
+                    try:
+                        with self.env.cr.savepoint():
+                            move.action_post()
+                    except Exception as e:
+                        move.message_post(body=f"Automatic posting failed: {str(e)}")
+                move.marketplace_post_pending = False
+
+            if not self.env.registry.in_test_mode():
+                self.env.cr.commit()
 
     check_if_email_is_send = fields.Boolean(copy=False)
     @api.constrains('payment_state')
@@ -272,54 +276,101 @@ class AccountMove(models.Model):
                 elif move.move_type == "out_refund":
                     move.name_placeholder = (move.journal_id.credit_note_name or "") + (move.journal_id.code or "") + (sequence.next_by_id() or "")
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """
-        Creates a new account move (invoice or credit note) and assigns it a custom sequence number
-        based on the journal configuration. If no sequence exists for the journal, a new sequence
-        is created. If this is the first invoice or credit note in the journal, the sequence is reset to 1.
+        Creates new account moves (invoices or credit notes) and assigns them custom sequence numbers
+        based on the journal configuration. If no sequence exists for a journal, a new sequence
+        is created. If these are the first invoices or credit notes in the journal, the sequence is reset to 1.
+
+        Moves are numbered per journal with a single sequence reservation, so a batch of
+        credit notes costs one sequence call per journal instead of one per move.
 
         Args:
-            vals (dict): The values used to create the new account move.
+            vals_list (list): The values used to create the new account moves.
 
         Returns:
-            AccountMove: The created account move record.
+            AccountMove: The created account move records.
         """
 
-        # Create the account move (invoice/credit note)
-        result = super(AccountMove, self).create(vals)
+        # Create the account moves (invoices/credit notes)
+        result = super(AccountMove, self).create(vals_list)
+
+        # Only invoices and credit notes get a custom name
+        customer_moves = result.filtered(lambda move: move.move_type in ["out_invoice", "out_refund"])
 
-        # Check if the move is an invoice or credit note
-        if result.move_type in ["out_invoice", "out_refund"]:
+        for journal, journal_moves in customer_moves.grouped('journal_id').items():
             # Define the custom sequence code based on the journal code
-            sequence_code = f'account.move.custom_code_{result.journal_id.code}'
+            sequence_code = f'account.move.custom_code_{journal.code}'
 
             # Check if the sequence already exists, if not, create a new one
             sequence = self.env['ir.sequence'].search([('code', '=', sequence_code)], limit=1)
             if not sequence:
-                sequence = self.create_new_sequence(result.journal_id.name, sequence_code)
-
-
+                sequence = self.create_new_sequence(journal.name, sequence_code)
 
             # Check if there are any previous invoices/credit notes in the same journal
-            existing_moves = self.env['account.move'].search([
+            existing_moves = self.env['account.move'].search_count([
                 ('move_type', 'in', ['out_invoice', 'out_refund']),
-                ('journal_id', '=', result.journal_id.id),
-                ('id', '!=', result.id)  # Exclude the current invoice/credit note
-            ])
+                ('journal_id', '=', journal.id),
+                ('id', 'not in', journal_moves.ids)  # Exclude the moves of this batch
+            ], limit=1)
 
             if not existing_moves:
                 # Reset the sequence number to 1 if there are no previous invoices/credit notes
                 sequence.number_next = 1
 
-            # Set the name of the invoice/credit note using the sequence
-            if result.move_type == "out_invoice":
-                result.name = (result.journal_id.invoice_name or "") + (result.journal_id.code or "") + (sequence.next_by_id() or "")
-            elif result.move_type == "out_refund":
-                result.name = (result.journal_id.credit_note_name or "") + (result.credit_note_name.code or "") + (sequence.next_by_id() or "")
+            # Set the name of each invoice/credit note using the reserved numbers
+            numbers = self._reserve_sequence_numbers(sequence, len(journal_moves))
+            for move, number in zip(journal_moves, numbers):
+                if move.move_type == "out_invoice":
+                    move.name = (journal.invoice_name or "") + (journal.code or "") + number
+                elif move.move_type == "out_refund":
+                    move.name = (journal.credit_note_name or "") + (journal.code or "") + number
 
         return result
 
+    def _reserve_sequence_numbers(self, sequence, count):
+        """
+        Reserve several consecutive numbers of a sequence in one call.
+
+        Args:
+            sequence: The ir.sequence record to draw from
+            count: The amount of numbers to reserve
+
+        Returns:
+            list: The formatted numbers (prefix, padding and suffix applied), in ascending order
+        """
+        if not count:
+            return []
+
+        # Date range sequences resolve their sub-sequence per date, keep the standard path
+        if sequence.use_date_range:
+            return [sequence.next_by_id() for _ in range(count)]
+
+        if sequence.implementation == 'standard':
+            # One round trip for the whole batch on the PostgreSQL sequence
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ['ir_sequence_%03d' % sequence.id, count]
+            )
+            numbers = sorted(row[0] for row in self.env.cr.fetchall())
+        else:
+            # No gap sequences: lock the row and move number_next past the whole batch
+            self.env.cr.execute(
+                "SELECT number_next FROM ir_sequence WHERE id = %s FOR UPDATE NOWAIT",
+                [sequence.id]
+            )
+            number_next = self.env.cr.fetchone()[0]
+            step = sequence.number_increment
+            self.env.cr.execute(
+                "UPDATE ir_sequence SET number_next = number_next + %s WHERE id = %s",
+                [step * count, sequence.id]
+            )
+            sequence.invalidate_recordset(['number_next'])
+            numbers = [number_next + step * index for index in range(count)]
+
+        return [sequence.get_next_char(number) for number in numbers]
+
     def create_new_sequence(self, name, sequence_code):
         """
         Create a new sequence for invoice numbering.
@@ -0,0 +1,257 @@
+import logging
+from datetime import timedelta
+
+import psycopg2
+
+from odoo import fields, models, api, _
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class PackageArchive(models.Model):
+    """
+    Cold storage of shipped packages and their quants.
+
+    Packages of deliveries older than ``ngr_addon.package_archive_days`` are moved
+    out of stock_quant_package / stock_quant into this compact table: the lookup
+    columns (NVE, tracking reference, delivery) stay indexed, everything else is
+    kept as the original rows in JSON so a package can be restored with its
+    original id and all references to it.
+    """
+    _name = 'ngr.package.archive'
+    _description = 'Archived Package'
+    _order = 'id desc'
+    _log_access = False
+
+    package_id = fields.Integer(string='Package ID', readonly=True, index=True)
+    name = fields.Char(readonly=True)
+    nve = fields.Char(string='NVE', readonly=True, index='btree_not_null')
+    tracking_ref = fields.Char(readonly=True, index='btree_not_null')
+    picking_id = fields.Many2one('stock.picking', string='Delivery Ref', readonly=True,
+                                 index='btree_not_null', ondelete='set null')
+    date_done = fields.Datetime(string='Shipped On', readonly=True)
+    archive_date = fields.Datetime(readonly=True)
+    net_weight = fields.Float(digits='Product Unit of Measure', readonly=True)
+    gross_weight = fields.Float(digits='Product Unit of Measure', readonly=True)
+    data = fields.Json(readonly=True)
+
+    _ARCHIVE_QUERY = """
+        INSERT INTO ngr_package_archive (package_id, name, nve, tracking_ref, picking_id, date_done,
+                                         archive_date, net_weight, gross_weight, data)
+        SELECT pkg.id,
+               pkg.name,
+               pkg.nve,
+               pkg.tracking_ref,
+               pkg.picking_id,
+               sp.date_done,
+               NOW() AT TIME ZONE 'UTC',
+               (SELECT COALESCE(SUM(quant.net_weight), 0) FROM stock_quant quant WHERE quant.package_id = pkg.id),
+               (SELECT COALESCE(SUM(quant.gross_weight), 0) FROM stock_quant quant WHERE quant.package_id = pkg.id),
+               jsonb_build_object(
+                   'package', to_jsonb(pkg),
+                   'quants', COALESCE((
+                       SELECT jsonb_agg(to_jsonb(quant))
+                         FROM stock_quant quant
+                        WHERE quant.package_id = pkg.id
+                   ), '[]'::jsonb),
+                   'package_levels', COALESCE((
+                       SELECT jsonb_agg(to_jsonb(level) || jsonb_build_object(
+                                  'move_ids', (SELECT jsonb_agg(id) FROM stock_move WHERE package_level_id = level.id),
+                                  'move_line_ids', (SELECT jsonb_agg(id) FROM stock_move_line WHERE package_level_id = level.id)
+                              ))
+                         FROM stock_package_level level
+                        WHERE level.package_id = pkg.id
+                   ), '[]'::jsonb),
+                   'move_line_ids', COALESCE((
+                       SELECT jsonb_agg(id) FROM stock_move_line WHERE package_id = pkg.id
+                   ), '[]'::jsonb),
+                   'result_move_line_ids', COALESCE((
+                       SELECT jsonb_agg(id) FROM stock_move_line WHERE result_package_id = pkg.id
+                   ), '[]'::jsonb),
+                   'result_picking_ids', COALESCE((
+                       SELECT jsonb_agg(stock_picking_id)
+                         FROM stock_picking_stock_quant_package_rel
+                        WHERE stock_quant_package_id = pkg.id
+                   ), '[]'::jsonb),
+                   'print_jobs', COALESCE((
+                       SELECT jsonb_agg(to_jsonb(job))
+                         FROM ngr_label_print_job job
+                        WHERE job.package_id = pkg.id
+                   ), '[]'::jsonb)
+               )
+          FROM stock_quant_package pkg
+     LEFT JOIN stock_picking sp ON sp.id = pkg.picking_id
+         WHERE pkg.id = ANY(%(ids)s)
+    """
+
+    _REMOVE_QUERIES = [
+        "UPDATE stock_move SET package_level_id = NULL WHERE package_level_id IN "
+        "(SELECT id FROM stock_package_level WHERE package_id = ANY(%(ids)s))",
+        "UPDATE stock_move_line SET package_level_id = NULL WHERE package_level_id IN "
+        "(SELECT id FROM stock_package_level WHERE package_id = ANY(%(ids)s))",
+        "UPDATE stock_move_line SET package_id = NULL WHERE package_id = ANY(%(ids)s)",
+        "UPDATE stock_move_line SET result_package_id = NULL WHERE result_package_id = ANY(%(ids)s)",
+        "DELETE FROM stock_package_level WHERE package_id = ANY(%(ids)s)",
+        "DELETE FROM stock_quant WHERE package_id = ANY(%(ids)s)",
+        "DELETE FROM stock_quant_package WHERE id = ANY(%(ids)s)",
+    ]
+
+    _RESTORE_QUERIES = [
+        "INSERT INTO stock_quant_package "
+        "SELECT (jsonb_populate_record(NULL::stock_quant_package, data->'package')).* "
+        "FROM ngr_package_archive WHERE id = ANY(%(ids)s)",
+        "INSERT INTO stock_quant "
+        "SELECT (jsonb_populate_recordset(NULL::stock_quant, data->'quants')).* "
+        "FROM ngr_package_archive WHERE id = ANY(%(ids)s)",
+        "INSERT INTO stock_package_level "
+        "SELECT (jsonb_populate_recordset(NULL::stock_package_level, data->'package_levels')).* "
+        "FROM ngr_package_archive WHERE id = ANY(%(ids)s)",
+        "UPDATE stock_move SET package_level_id = (level->>'id')::int "
+        "FROM ngr_package_archive archive, jsonb_array_elements(archive.data->'package_levels') level "
+        "WHERE archive.id = ANY(%(ids)s) AND level->'move_ids' @> to_jsonb(stock_move.id)",
+        "UPDATE stock_move_line SET package_level_id = (level->>'id')::int "
+        "FROM ngr_package_archive archive, jsonb_array_elements(archive.data->'package_levels') level "
+        "WHERE archive.id = ANY(%(ids)s) AND level->'move_line_ids' @> to_jsonb(stock_move_line.id)",
+        "UPDATE stock_move_line SET package_id = archive.package_id "
+        "FROM ngr_package_archive archive "
+        "WHERE archive.id = ANY(%(ids)s) AND archive.data->'move_line_ids' @> to_jsonb(stock_move_line.id)",
+        "UPDATE stock_move_line SET result_package_id = archive.package_id "
+        "FROM ngr_package_archive archive "
+        "WHERE archive.id = ANY(%(ids)s) AND archive.data->'result_move_line_ids' @> to_jsonb(stock_move_line.id)",
+        "INSERT INTO stock_picking_stock_quant_package_rel (stock_picking_id, stock_quant_package_id) "
+        "SELECT picking.value::int, archive.package_id "
+        "FROM ngr_package_archive archive, jsonb_array_elements_text(archive.data->'result_picking_ids') picking "
+        "WHERE archive.id = ANY(%(ids)s) "
+        "AND EXISTS (SELECT 1 FROM stock_picking WHERE id = picking.value::int) "
+        "ON CONFLICT DO NOTHING",
+        # Print jobs come back unless their printer or delivery has been deleted meanwhile
+        "INSERT INTO ngr_label_print_job "
+        "SELECT job.* "
+        "FROM ngr_package_archive archive, "
+        "jsonb_populate_recordset(NULL::ngr_label_print_job, archive.data->'print_jobs') job "
+        "WHERE archive.id = ANY(%(ids)s) "
+        "AND EXISTS (SELECT 1 FROM ngr_label_printer WHERE id = job.printer_id) "
+        "AND EXISTS (SELECT 1 FROM stock_picking WHERE id = job.picking_id)",
+        "DELETE FROM ngr_package_archive WHERE id = ANY(%(ids)s)",
+    ]
+
+    @api.model
+    def _cron_archive_packages(self):
+        """
+        Move the packages of old deliveries to the archive, one committed chunk at a time.
+
+        The age (in days) and the chunk size are read from the system parameters
+        ``ngr_addon.package_archive_days`` (default 365) and
+        ``ngr_addon.package_archive_chunk_size`` (default 500).
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        days = int(params.get_param('ngr_addon.package_archive_days', 365))
+        chunk_size = int(params.get_param('ngr_addon.package_archive_chunk_size', 500))
+        cutoff = fields.Datetime.now() - timedelta(days=days)
+
+        self.env.flush_all()
+        skipped_ids = []
+        while True:
+            package_ids = self._get_archivable_package_ids(cutoff, chunk_size, skipped_ids)
+            if not package_ids:
+                break
+            skipped_ids += self._archive_package_ids(package_ids)
+            if not self.env.registry.in_test_mode():
+                self.env.cr.commit()
+        self.env.invalidate_all()
+
+    def _get_archivable_package_ids(self, cutoff, limit, skipped_ids):
+        """
+        Return packages of outgoing deliveries done before the cutoff whose goods
+        have all left the warehouse.
+        """
+        self.env.cr.execute("""
+            SELECT pkg.id
+              FROM stock_quant_package pkg
+              JOIN stock_picking sp ON sp.id = pkg.picking_id
+              JOIN stock_picking_type spt ON spt.id = sp.picking_type_id
+             WHERE sp.state = 'done'
+               AND sp.date_done < %s
+               AND spt.code = 'outgoing'
+               AND NOT pkg.id = ANY(%s)
+               AND NOT EXISTS (
+                        SELECT 1
+                          FROM stock_quant quant
+                          JOIN stock_location location ON location.id = quant.location_id
+                         WHERE quant.package_id = pkg.id
+                           AND location.usage IN ('internal', 'transit')
+                   )
+          ORDER BY pkg.id
+             LIMIT %s
+        """, [cutoff, skipped_ids, limit])
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    def _archive_package_ids(self, package_ids):
+        """
+        Archive a chunk of packages, falling back to one package at a time on failure.
+
+        Returns:
+            list: The ids of packages that could not be archived (still referenced elsewhere).
+        """
+        try:
+            with self.env.cr.savepoint():
+                self._move_to_archive(package_ids)
+            return []
+        except psycopg2.IntegrityError:
+            if len(package_ids) == 1:
+                _logger.warning("Package %s is still referenced and cannot be archived", package_ids[0])
+                return package_ids
+            return [
+                failed_id
+                for package_id in package_ids
+                for failed_id in self._archive_package_ids([package_id])
+            ]
+
+    def _move_to_archive(self, package_ids):
+        params = {'ids': package_ids}
+        self.env.cr.execute(self._ARCHIVE_QUERY, params)
+        for query in self._REMOVE_QUERIES:
+            self.env.cr.execute(query, params)
+
+    def action_restore(self):
+        """
+        Bring archived packages back with their original ids, quants and references.
+
+        The restore writes the stock tables with SQL, so it is limited to the users
+        allowed to delete archive records (inventory managers).
+        """
+        self.check_access('unlink')
+        self.env.flush_all()
+        params = {'ids': self.ids}
+        for query in self._RESTORE_QUERIES:
+            self.env.cr.execute(query, params)
+        self.env.invalidate_all()
+
+    @api.model
+    def restore_by_reference(self, reference):
+        """
+        Restore the archived package with the given NVE or tracking reference.
+
+        Restricted like action_restore().
+
+        Returns:
+            stock.quant.package: The restored package, empty if nothing was archived.
+        """
+        self.check_access('unlink')
+        archives = self.search(['|', ('nve', '=', reference), ('tracking_ref', '=', reference)])
+        package_ids = archives.mapped('package_id')
+        archives.action_restore()
+        return self.env['stock.quant.package'].browse(package_ids)
+
+
+class StockQuantPackage(models.Model):
+    _inherit = 'stock.quant.package'
+
+    @api.constrains('tracking_ref')
+    def _check_tracking_ref_archive(self):
+        """Keep tracking references unique across working and archived packages."""
+        for package in self.filtered('tracking_ref'):
+            if self.env['ngr.package.archive'].sudo().search_count(
+                    [('tracking_ref', '=', package.tracking_ref)], limit=1):
+                raise ValidationError(_("Tracking number should not be repeated."))
@@ -2,6 +2,7 @@ from email.policy import default
 
 from odoo import fields, models, api, _
 from odoo.exceptions import UserError,ValidationError
+from odoo.tools.sql import create_index
 
 
 class SaleOrder(models.Model):
@@ -24,6 +25,18 @@ class SaleOrder(models.Model):
 
     journal_id = fields.Many2one(comodel_name='account.journal',copy=False)
 
+    def init(self):
+        super().init()
+        # Exact lookups of order names and marketplace references by the document trace
+        create_index(self.env.cr, 'sale_order_name_btree_index', self._table, ['name'])
+        create_index(
+            self.env.cr,
+            'sale_order_client_order_ref_index',
+            self._table,
+            ['client_order_ref'],
+            where='client_order_ref IS NOT NULL',
+        )
+
     def action_confirm(self):
         """Override action_confirm to auto-create and post invoices for marketplace orders."""
         result = super(SaleOrder, self).action_confirm()
@@ -50,9 +63,9 @@ class SaleOrder(models.Model):
         # MediaMarkt (marketplace '7') doesn't auto-create invoices
         if self.market_place != '7' and self.to_market_place:
             invoices = self._create_invoices()
-            # only Post Marketplaces Invoices
+            # only Post Marketplaces Invoices, in the background worker of their journal
             if self.to_market_place :
-                invoices.action_post()
+                invoices._schedule_marketplace_posting()
     
     def _find_marketplace_journal(self, marketplace_name):
         """Find the appropriate journal for the marketplace.
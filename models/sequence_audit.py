@@ -0,0 +1,337 @@
+import re
+
+from odoo import fields, models, api, _
+
+from ..tools import stream_query
+
+
+class SequenceAudit(models.Model):
+    """
+    One run of the invoice number integrity auditor.
+
+    The auditor parses the custom invoice / credit note names
+    (prefix + journal code + year + padded number) and checks them per journal and
+    year for gaps, duplicates and numbers whose date is earlier than the previous
+    number's. Only moves created since the stored watermark are processed, the
+    per-journal state of earlier runs is kept in ngr.sequence.audit.state.
+    """
+    _name = 'ngr.sequence.audit'
+    _description = 'Invoice Number Audit'
+    _order = 'id desc'
+
+    _audit_chunk_size = 2000
+
+    name = fields.Char(required=True, readonly=True)
+    date = fields.Datetime(required=True, readonly=True, default=fields.Datetime.now)
+    from_move_id = fields.Integer(string='From Move ID', readonly=True)
+    to_move_id = fields.Integer(string='To Move ID', readonly=True)
+    move_count = fields.Integer(string='Audited Documents', readonly=True)
+    finding_ids = fields.One2many('ngr.sequence.audit.finding', 'audit_id', string='Findings', readonly=True)
+    finding_count = fields.Integer(compute='_compute_finding_count')
+
+    _AUDIT_QUERY = """
+        SELECT id, name, journal_id, move_type, COALESCE(invoice_date, date) AS date
+          FROM account_move
+         WHERE id > %(watermark)s
+           AND id < %(limit_id)s
+           AND move_type IN ('out_invoice', 'out_refund')
+           AND name IS NOT NULL
+           AND name != '/'
+      ORDER BY id
+    """
+
+    @api.depends('finding_ids')
+    def _compute_finding_count(self):
+        for audit in self:
+            audit.finding_count = len(audit.finding_ids)
+
+    @api.model
+    def _cron_audit_invoice_numbers(self):
+        self._run_audit()
+
+    @api.model
+    def _run_audit(self):
+        """
+        Audit the invoices and credit notes created since the last run.
+
+        The id of the last audited move is stored in the system parameter
+        ``ngr_addon.sequence_audit_watermark``. Move ids are not committed in id
+        order, so the run stops before the first move that may have a lower id still
+        uncommitted (see :meth:`_get_audit_limit_id`) instead of skipping it for good.
+
+        Returns:
+            ngr.sequence.audit: The audit run, empty if there was nothing new.
+        """
+        params = self.env['ir.config_parameter'].sudo()
+        watermark = int(params.get_param('ngr_addon.sequence_audit_watermark', 0))
+
+        self.env.flush_all()
+        audit = self.browse()
+        patterns = self._get_name_patterns()
+        states = _AuditStates(self.env)
+        last_id = watermark
+        move_count = 0
+
+        query_params = {'watermark': watermark, 'limit_id': self._get_audit_limit_id(watermark)}
+        for rows in stream_query(self.env.cr, self._AUDIT_QUERY, query_params, self._audit_chunk_size):
+            if not audit:
+                audit = self.create({
+                    'name': _("Audit %s", fields.Datetime.to_string(fields.Datetime.now())),
+                    'from_move_id': rows[0]['id'],
+                })
+            audit._check_chunk(rows, patterns, states)
+            last_id = rows[-1]['id']
+            move_count += len(rows)
+
+        if audit:
+            states.save()
+            audit.write({'to_move_id': last_id, 'move_count': move_count})
+            params.set_param('ngr_addon.sequence_audit_watermark', last_id)
+        return audit
+
+    @api.model
+    def _get_audit_limit_id(self, watermark):
+        """
+        Return the first move id the run must not reach yet.
+
+        A move created in a transaction that is still open is invisible, while moves
+        with higher ids may already be committed. Moves are only audited up to the
+        first move created within ``ngr_addon.sequence_audit_margin`` minutes
+        (default 10) before now or before the start of the oldest open writing
+        transaction, whichever is earlier; later moves are left for the next run.
+        """
+        margin = int(self.env['ir.config_parameter'].sudo().get_param('ngr_addon.sequence_audit_margin', 10))
+        self.env.cr.execute("""
+            SELECT MIN(id)
+              FROM account_move
+             WHERE id > %(watermark)s
+               AND create_date >= (
+                        SELECT LEAST(NOW(), MIN(activity.xact_start)) AT TIME ZONE 'UTC'
+                          FROM pg_stat_activity activity
+                         WHERE activity.datname = current_database()
+                           AND activity.backend_xid IS NOT NULL
+                           AND activity.pid != pg_backend_pid()
+                   ) - make_interval(mins => %(margin)s)
+        """, {'watermark': watermark, 'margin': margin})
+        limit_id = self.env.cr.fetchone()[0]
+        # Without recent moves everything visible is committed
+        return limit_id or 2 ** 31 - 1
+
+    @api.model
+    def _get_name_patterns(self):
+        """
+        Build the name pattern of every sales journal and document type.
+
+        Returns:
+            dict: (journal_id, move_type) -> compiled regex capturing year and number.
+        """
+        patterns = {}
+        for journal in self.env['account.journal'].with_context(active_test=False).search([('type', '=', 'sale')]):
+            code = re.escape(journal.code or '')
+            for move_type, prefix in (('out_invoice', journal.invoice_name), ('out_refund', journal.credit_note_name)):
+                patterns[journal.id, move_type] = re.compile(r'^%s%s(\d{4})(\d+)$' % (re.escape(prefix or ''), code))
+        return patterns
+
+    def _check_chunk(self, rows, patterns, states):
+        """
+        Check one chunk of moves, in creation order, against the journal states.
+
+        Findings are created right away, so a number turning up later in the same
+        run can still close the gap it belongs to.
+        """
+        self.ensure_one()
+        Finding = self.env['ngr.sequence.audit.finding']
+        duplicates = self._get_duplicates([row['name'] for row in rows])
+
+        for row in rows:
+            pattern = patterns.get((row['journal_id'], row['move_type']))
+            match = pattern and pattern.match(row['name'])
+            if not match:
+                Finding.create(self._finding_vals(row, 'unparsed'))
+                continue
+
+            year, number = int(match.group(1)), int(match.group(2))
+            other_ids = [move_id for move_id in duplicates.get(row['name'], []) if move_id != row['id']]
+            if other_ids:
+                Finding.create(self._finding_vals(
+                    row, 'duplicate', year=year, number=number,
+                    note=_("Same name as move(s) %s", ', '.join(map(str, other_ids))),
+                ))
+                # The number is still used: the state advances past it like for any other row
+
+            state = states.get(row['journal_id'], year)
+            if state['carried'] and number == 1:
+                # The sequence restarted with the new year
+                state.update(last_number=number, last_date=row['date'], carried=False)
+            elif number > state['last_number']:
+                if number > state['last_number'] + 1:
+                    Finding.create(self._finding_vals(
+                        row, 'gap', year=year, number=number,
+                        missing_from=state['last_number'] + 1, missing_to=number - 1,
+                    ))
+                if state['last_date'] and row['date'] < state['last_date']:
+                    Finding.create(self._finding_vals(
+                        row, 'out_of_order', year=year, number=number,
+                        note=_("Dated %(date)s, before the previous number dated %(previous)s",
+                               date=row['date'], previous=state['last_date']),
+                    ))
+                state.update(last_number=number, last_date=row['date'], carried=False)
+            else:
+                # A number below the highest one fills a gap reported earlier
+                Finding._fill_gap(row['journal_id'], year, number)
+
+    def _get_duplicates(self, names):
+        """Return the names used by more than one invoice / credit note, with their move ids."""
+        self.env.cr.execute("""
+            SELECT name, array_agg(id ORDER BY id)
+              FROM account_move
+             WHERE name = ANY(%s)
+               AND move_type IN ('out_invoice', 'out_refund')
+          GROUP BY name
+            HAVING COUNT(*) > 1
+        """, [names])
+        return dict(self.env.cr.fetchall())
+
+    def _finding_vals(self, row, kind, **values):
+        return dict(
+            values,
+            audit_id=self.id,
+            kind=kind,
+            journal_id=row['journal_id'],
+            move_id=row['id'],
+            name=row['name'],
+        )
+
+    @api.model
+    def action_run_audit(self):
+        audit = self._run_audit()
+        if not audit:
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'message': _("No new invoices or credit notes to audit."),
+                    'type': 'info',
+                },
+            }
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'ngr.sequence.audit',
+            'res_id': audit.id,
+            'view_mode': 'form',
+        }
+
+    def action_view_findings(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Findings'),
+            'res_model': 'ngr.sequence.audit.finding',
+            'view_mode': 'list',
+            'domain': [('audit_id', '=', self.id)],
+        }
+
+
+class _AuditStates:
+    """
+    In-memory view of ngr.sequence.audit.state for one run, written back once at the end.
+
+    The custom sequences do not restart with the year, so the first number of a year
+    continues from the previous year's last number; a restart at 1 is accepted too.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.records = {}
+        self.values = {}
+
+    def get(self, journal_id, year):
+        key = (journal_id, year)
+        if key not in self.values:
+            State = self.env['ngr.sequence.audit.state']
+            record = State.search([('journal_id', '=', journal_id), ('year', '=', year)], limit=1)
+            self.records[key] = record
+            if record:
+                self.values[key] = {'last_number': record.last_number, 'last_date': record.last_date, 'carried': False}
+            else:
+                previous = max(
+                    (values['last_number'] for (other_journal_id, other_year), values in self.values.items()
+                     if other_journal_id == journal_id and other_year < year),
+                    default=0,
+                ) or State.search([('journal_id', '=', journal_id), ('year', '<', year)],
+                                  order='year desc', limit=1).last_number
+                self.values[key] = {'last_number': previous, 'last_date': False, 'carried': bool(previous)}
+        return self.values[key]
+
+    def save(self):
+        State = self.env['ngr.sequence.audit.state']
+        to_create = []
+        for (journal_id, year), values in self.values.items():
+            values = {'last_number': values['last_number'], 'last_date': values['last_date']}
+            record = self.records[journal_id, year]
+            if record:
+                record.write(values)
+            else:
+                to_create.append(dict(values, journal_id=journal_id, year=year))
+        State.create(to_create)
+
+
+class SequenceAuditState(models.Model):
+    _name = 'ngr.sequence.audit.state'
+    _description = 'Invoice Number Audit State'
+
+    journal_id = fields.Many2one('account.journal', required=True, ondelete='cascade')
+    year = fields.Integer(required=True)
+    last_number = fields.Integer(help='Highest number audited so far')
+    last_date = fields.Date(help='Date of the highest number audited so far')
+
+    _sql_constraints = [
+        ('journal_year_unique', 'unique (journal_id, year)', "There is already an audit state for this journal and year."),
+    ]
+
+
+class SequenceAuditFinding(models.Model):
+    _name = 'ngr.sequence.audit.finding'
+    _description = 'Invoice Number Audit Finding'
+    _order = 'journal_id, year, number, id'
+
+    audit_id = fields.Many2one('ngr.sequence.audit', required=True, index=True, ondelete='cascade')
+    journal_id = fields.Many2one('account.journal', index=True, ondelete='cascade')
+    year = fields.Integer()
+    kind = fields.Selection([
+        ('gap', 'Gap'),
+        ('duplicate', 'Duplicate'),
+        ('out_of_order', 'Out of Order Date'),
+        ('unparsed', 'Unknown Name Format'),
+    ], required=True)
+    move_id = fields.Many2one('account.move', string='Document', ondelete='set null')
+    name = fields.Char(string='Document Name')
+    number = fields.Integer()
+    missing_from = fields.Integer()
+    missing_to = fields.Integer()
+    note = fields.Char()
+    resolved = fields.Boolean(help='The missing numbers of the gap have been used since')
+
+    @api.model
+    def _fill_gap(self, journal_id, year, number):
+        """Remove a number that turned up late from the open gap covering it."""
+        gap = self.search([
+            ('kind', '=', 'gap'),
+            ('resolved', '=', False),
+            ('journal_id', '=', journal_id),
+            ('year', '=', year),
+            ('missing_from', '<=', number),
+            ('missing_to', '>=', number),
+        ], limit=1)
+        if not gap:
+            return
+
+        if gap.missing_from == gap.missing_to:
+            gap.resolved = True
+        elif number == gap.missing_from:
+            gap.missing_from += 1
+        elif number == gap.missing_to:
+            gap.missing_to -= 1
+        else:
+            gap.copy({'missing_from': number + 1, 'missing_to': gap.missing_to})
+            gap.missing_to = number - 1
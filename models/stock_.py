@@ -1,5 +1,6 @@
-from odoo import fields, api, models, _
+from odoo import fields, api, models, Command, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools.sql import create_index
 
 
 class AccountJournal(models.Model):
@@ -26,6 +27,45 @@ class AccountJournal(models.Model):
         help='This name will appear on the credit note before the shortcode.'
     )
 
+    # Background worker posting the marketplace invoices of this journal
+    # Odoo never runs the same cron twice at a time, so a journal's invoices are posted one batch after another
+    posting_cron_id = fields.Many2one('ir.cron', string='Posting Worker', readonly=True, copy=False)
+
+    def _get_posting_cron(self):
+        """
+        Return the posting worker of the journal, creating it on first use.
+
+        The cron gets an ngr_addon xmlid so it is removed with the module, and runs as
+        the "NGR Marketplace Posting" user, which has invoicing rights only.
+
+        Returns:
+            ir.cron: The scheduled action posting the pending invoices of this journal.
+        """
+        self.ensure_one()
+        if not self.posting_cron_id:
+            user = self.env.ref('ngr_addon.user_marketplace_posting').sudo()
+            if self.company_id not in user.company_ids:
+                user.company_ids = [Command.link(self.company_id.id)]
+            cron = self.env['ir.cron'].sudo().create({
+                'name': f'NGR: Post {self.name} Invoices',
+                'model_id': self.env['ir.model']._get_id('account.move'),
+                'state': 'code',
+                'code': f'model._cron_post_marketplace_invoices({self.id})',
+                'user_id': user.id,
+                'interval_number': 1,
+                'interval_type': 'hours',
+                'active': True,
+            })
+            self.env['ir.model.data'].sudo().create({
+                'module': 'ngr_addon',
+                'name': f'ir_cron_post_marketplace_invoices_{self.id}',
+                'model': 'ir.cron',
+                'res_id': cron.id,
+                'noupdate': True,
+            })
+            self.sudo().posting_cron_id = cron
+        return self.posting_cron_id
+
     def unlink(self):
         """
         Overrides the unlink method to ensure that if an account journal is deleted,
@@ -49,6 +89,10 @@ class AccountJournal(models.Model):
             if related_sequence_object:
                 related_sequence_object.unlink()
 
+            # Remove the posting worker of the journal as well
+            if rec.posting_cron_id:
+                rec.posting_cron_id.sudo().unlink()
+
         return super(AccountJournal, self).unlink()
 
 
@@ -205,14 +249,183 @@ class StockPicking(models.Model):
 
     account_journal_id = fields.Many2one('account.journal', string='Account Journal')
 
-    # Related field to check NVE activation from the sale order's journal
-    # This field automatically reflects the activate_nve value from the journal
+    # Stored copy of the NVE activation of the sale order's journal
+    # Recomputed whenever the journal flag changes, never written back to the journal
     activate_nve = fields.Boolean(
-        related='sale_id.journal_id.activate_nve',
-        readonly=False,
+        compute='_compute_activate_nve',
+        store=True,
+        index=True,
         help='Automatically synced with journal NVE activation status'
     )
 
+    # NVE work state of ready / done outgoing deliveries with NVE activated
+    # Empty for every other picking so the work queue only scans open work
+    nve_state = fields.Selection([
+        ('missing_package', 'Missing Package'),
+        ('pending', 'NVE Pending'),
+        ('done', 'NVE Assigned'),
+    ], string='NVE Status', compute='_compute_nve_state', store=True, index=True, copy=False,
+        help='Missing Package: a quantity is not assigned to a package.\n'
+             'NVE Pending: at least one package has no NVE yet.\n'
+             'NVE Assigned: every package has its NVE.')
+
+    # Stored summary of the result packages, so list views and labels read a single table
+    package_count = fields.Integer(string='Packages', compute='_compute_package_summary', store=True)
+    package_nve_count = fields.Integer(string='Packages with NVE', compute='_compute_package_summary', store=True)
+    package_nves = fields.Char(string='NVEs', compute='_compute_package_summary', store=True)
+    package_net_weight = fields.Float(string='Net Weight', digits='Stock Weight',
+                                      compute='_compute_package_summary', store=True)
+    package_gross_weight = fields.Float(string='Gross Weight', digits='Stock Weight',
+                                        compute='_compute_package_summary', store=True)
+    is_fully_packed = fields.Boolean(string='Fully Packed', compute='_compute_package_summary', store=True,
+                                     help='Every move line is assigned to a result package')
+
+    def init(self):
+        """
+        Create the indexes of the NVE work queue, the carrier manifests and the document trace.
+
+        The queue and manifest indexes are partial: only the rows each feature scans
+        are indexed, so both stay fast no matter how many historical deliveries exist.
+        """
+        super().init()
+        create_index(
+            self.env.cr,
+            'stock_picking_nve_queue_index',
+            self._table,
+            ['scheduled_date', 'id'],
+            where="nve_state IN ('missing_package', 'pending')",
+        )
+        # Done deliveries per carrier and day, used by the carrier manifests
+        create_index(
+            self.env.cr,
+            'stock_picking_carrier_date_done_index',
+            self._table,
+            ['carrier_id', 'date_done'],
+            where="state = 'done' AND carrier_id IS NOT NULL",
+        )
+        # Join and lookup columns of the document trace
+        create_index(self.env.cr, 'stock_picking__sale_id_index', self._table, ['sale_id'])
+        create_index(
+            self.env.cr,
+            'stock_picking_carrier_tracking_ref_index',
+            self._table,
+            ['carrier_tracking_ref'],
+            where='carrier_tracking_ref IS NOT NULL',
+        )
+
+    @api.depends('sale_id.journal_id.activate_nve')
+    def _compute_activate_nve(self):
+        for picking in self:
+            picking.activate_nve = picking.sale_id.journal_id.activate_nve
+
+    @api.depends('activate_nve', 'picking_type_id.code', 'state',
+                 'is_fully_packed', 'package_count', 'package_nve_count')
+    def _compute_nve_state(self):
+        """
+        Compute the NVE status of outgoing deliveries from the package summary.
+
+        Only ready and done outgoing pickings with NVE activated get a status:
+        - missing_package: no package at all or a move line without result package
+        - pending: every move line is packed but a package has no NVE yet
+        - done: every package has an NVE
+        """
+        for picking in self:
+            if (not picking.activate_nve
+                    or picking.picking_type_id.code != 'outgoing'
+                    or picking.state not in ('assigned', 'done')):
+                picking.nve_state = False
+            elif not picking.is_fully_packed:
+                picking.nve_state = 'missing_package'
+            elif picking.package_nve_count < picking.package_count:
+                picking.nve_state = 'pending'
+            else:
+                picking.nve_state = 'done'
+
+    @api.depends('move_line_ids.result_package_id', 'move_line_ids.result_package_id.nve',
+                 'move_line_ids.result_package_id.quant_ids.net_weight',
+                 'move_line_ids.result_package_id.quant_ids.gross_weight')
+    def _compute_package_summary(self):
+        """
+        Compute the package summary of the pickings with one grouped query.
+
+        The summary covers the distinct result packages of the move lines: their count,
+        NVEs and weights, and whether every move line is assigned to a package.
+        Packages moved to ngr.package.archive still count: the archive keeps the move
+        lines they were the result package of, and their NVEs and weights.
+        """
+        summaries = {}
+        picking_ids = [picking_id for picking_id in self.ids if picking_id]
+        if picking_ids:
+            self.env['stock.move.line'].flush_model(['picking_id', 'result_package_id'])
+            self.env['stock.quant.package'].flush_model(['nve'])
+            self.env['stock.quant'].flush_model(['package_id', 'net_weight', 'gross_weight'])
+            self.env.cr.execute("""
+                WITH lines AS (
+                        SELECT aml.picking_id,
+                               bool_and(aml.result_package_id IS NOT NULL OR archived.id IS NOT NULL) AS fully_packed,
+                               array_agg(DISTINCT aml.result_package_id)
+                                   FILTER (WHERE aml.result_package_id IS NOT NULL) AS package_ids,
+                               array_agg(DISTINCT archived.id)
+                                   FILTER (WHERE archived.id IS NOT NULL) AS archive_ids
+                          FROM stock_move_line aml
+                     LEFT JOIN LATERAL (
+                                SELECT archive.id
+                                  FROM ngr_package_archive archive
+                                 WHERE aml.result_package_id IS NULL
+                                   AND archive.picking_id = aml.picking_id
+                                   AND archive.data->'result_move_line_ids' @> to_jsonb(aml.id)
+                                 LIMIT 1
+                               ) archived ON TRUE
+                         WHERE aml.picking_id = ANY(%s)
+                      GROUP BY aml.picking_id
+                )
+                SELECT lines.picking_id,
+                       lines.fully_packed AND (lines.package_ids IS NOT NULL OR lines.archive_ids IS NOT NULL),
+                       COALESCE(cardinality(lines.package_ids), 0) + COALESCE(cardinality(lines.archive_ids), 0),
+                       packages.nve_count,
+                       packages.nves,
+                       weights.net_weight,
+                       weights.gross_weight
+                  FROM lines
+             LEFT JOIN LATERAL (
+                        SELECT COUNT(package.nve) AS nve_count,
+                               string_agg(package.nve, ', ' ORDER BY package.id) AS nves
+                          FROM (
+                                SELECT pkg.id, pkg.nve
+                                  FROM stock_quant_package pkg
+                                 WHERE pkg.id = ANY(lines.package_ids)
+                             UNION ALL
+                                SELECT archive.package_id, archive.nve
+                                  FROM ngr_package_archive archive
+                                 WHERE archive.id = ANY(lines.archive_ids)
+                               ) package
+                       ) packages ON TRUE
+             LEFT JOIN LATERAL (
+                        SELECT COALESCE(SUM(weight.net_weight), 0) AS net_weight,
+                               COALESCE(SUM(weight.gross_weight), 0) AS gross_weight
+                          FROM (
+                                SELECT quant.net_weight, quant.gross_weight
+                                  FROM stock_quant quant
+                                 WHERE quant.package_id = ANY(lines.package_ids)
+                             UNION ALL
+                                SELECT archive.net_weight, archive.gross_weight
+                                  FROM ngr_package_archive archive
+                                 WHERE archive.id = ANY(lines.archive_ids)
+                               ) weight
+                       ) weights ON TRUE
+            """, [picking_ids])
+            summaries = {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
+        for picking in self:
+            fully_packed, count, nve_count, nves, net_weight, gross_weight = summaries.get(
+                picking.id, (False, 0, 0, False, 0.0, 0.0))
+            picking.is_fully_packed = fully_packed
+            picking.package_count = count
+            picking.package_nve_count = nve_count
+            picking.package_nves = nves
+            picking.package_net_weight = net_weight
+            picking.package_gross_weight = gross_weight
+
     def button_validate(self):
         """
         Override button_validate to generate NVE on picking validation.
@@ -234,6 +447,7 @@ class StockPicking(models.Model):
             self._validate_nve_requirements()
             self._create_invoice_and_link_delivery()
             self._compute_nve()
+            self.env['ngr.label.print.job']._enqueue_picking_labels(self)
 
         return result
 
@@ -6,11 +6,13 @@ class StockQuantPackage(models.Model):
     _inherit = 'stock.quant.package'
     # NVE field - The shipping unit number
     # Readonly to prevent manual modification, copy=False to avoid duplication
-    nve = fields.Char(string='NVE', readonly=True, copy=False,
+    nve = fields.Char(string='NVE', readonly=True, copy=False, index='btree_not_null',
                       help='Nummer der Versandeinheit - Shipping unit number')
     quant_ids = fields.One2many('stock.quant', 'package_id', 'Bulk Content', readonly=False,
                                 domain=['|', ('quantity', '!=', 0), ('reserved_quantity', '!=', 0)])
-    picking_id = fields.Many2one(comodel_name='stock.picking' , string='Delivery Ref',readonly=True)
+    picking_id = fields.Many2one(comodel_name='stock.picking' , string='Delivery Ref',readonly=True, index='btree_not_null')
+    manifest_id = fields.Many2one(comodel_name='ngr.carrier.manifest', string='Carrier Manifest', readonly=True,
+                                  copy=False, index='btree_not_null', ondelete='set null')
     picking_type_code  = fields.Char(related='package_type_id.barcode' , store=True)
     tracking_ref = fields.Char(copy=False,index=True)
     _sql_constraints = [
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import invoice_report
+from . import nve_report
@@ -0,0 +1,141 @@
+from collections import defaultdict
+
+from odoo import models, api
+
+from ..tools import replica_env
+
+
+class InvoiceReport(models.AbstractModel):
+    """
+    Invoice data of the invoice / credit note report.
+
+    Addresses, delivery, totals and lines (with product, EAN and tax) are collected
+    with two queries, on the read replica when replica routing is enabled. Invoices
+    the replica does not have yet, or has in an older version, are read from the primary:
+    the write dates of the invoice, customer, company and products are compared with
+    the primary, so a changed address or product is never printed stale.
+    """
+    _name = 'report.ngr_addon.de_invoice_report'
+    _description = 'Invoice Report'
+
+    # Write dates of every record the report data is read from, compared between replica and primary
+    _VERSION_COLUMNS = """
+               am.write_date,
+               partner.write_date,
+               company_partner.write_date,
+               (SELECT MAX(GREATEST(pp.write_date, pt.write_date))
+                  FROM account_move_line aml
+                  JOIN product_product pp ON pp.id = aml.product_id
+                  JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                 WHERE aml.move_id = am.id)
+    """
+
+    _FROM_CLAUSE = """
+          FROM account_move am
+          JOIN res_company company ON company.id = am.company_id
+          JOIN res_partner company_partner ON company_partner.id = company.partner_id
+     LEFT JOIN res_partner partner ON partner.id = am.partner_id
+    """
+
+    _VERSION_QUERY = f"""
+        SELECT am.id, ARRAY[{_VERSION_COLUMNS}]
+        {_FROM_CLAUSE}
+         WHERE am.id = ANY(%(ids)s)
+    """
+
+    _INVOICE_QUERY = f"""
+        SELECT am.id,
+               ARRAY[{_VERSION_COLUMNS}] AS version,
+               am.name,
+               am.move_type,
+               am.invoice_origin,
+               am.amount_untaxed,
+               am.amount_tax,
+               am.amount_total,
+               partner.name AS partner_name,
+               partner.street AS partner_street,
+               partner.zip AS partner_zip,
+               partner.city AS partner_city,
+               partner.lang AS partner_lang,
+               sp.name AS picking_name,
+               company_partner.street AS company_street,
+               company_partner.zip AS company_zip,
+               company_partner.city AS company_city,
+               company_partner.email AS company_email
+        {_FROM_CLAUSE}
+     LEFT JOIN stock_picking sp ON sp.id = am.picking_id
+         WHERE am.id = ANY(%(ids)s)
+    """
+
+    _LINE_QUERY = """
+        SELECT aml.move_id,
+               aml.quantity,
+               aml.price_unit,
+               aml.price_total,
+               COALESCE(pt.name->>%(lang)s, pt.name->>'en_US') AS product_name,
+               pp.barcode,
+               tax.amount AS tax_rate,
+               COALESCE(tax.name->>%(lang)s, tax.name->>'en_US') AS tax_name
+          FROM account_move_line aml
+     LEFT JOIN product_product pp ON pp.id = aml.product_id
+     LEFT JOIN product_template pt ON pt.id = pp.product_tmpl_id
+     LEFT JOIN LATERAL (
+                SELECT tax.amount, tax.name
+                  FROM account_move_line_account_tax_rel rel
+                  JOIN account_tax tax ON tax.id = rel.account_tax_id
+                 WHERE rel.account_move_line_id = aml.id
+              ORDER BY tax.sequence, tax.id
+                 LIMIT 1
+               ) tax ON TRUE
+         WHERE aml.move_id = ANY(%(ids)s)
+           AND aml.display_type IN ('product', 'line_section', 'line_note')
+      ORDER BY aml.move_id, aml.sequence, aml.id
+    """
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        docs = self.env['account.move'].browse(docids)
+        self.env.flush_all()
+        self.env.cr.execute(self._VERSION_QUERY, {'ids': docs.ids})
+        versions = dict(self.env.cr.fetchall())
+
+        with replica_env(self.env) as env:
+            invoices = {
+                move_id: invoice
+                for move_id, invoice in self._collect_invoices(env.cr, docs.ids).items()
+                if invoice['version'] == versions[move_id]
+            }
+
+        # Invoices created or changed after the replica's last replay are read from the primary
+        missing_ids = [move_id for move_id in docs.ids if move_id not in invoices]
+        if missing_ids:
+            invoices.update(self._collect_invoices(self.env.cr, missing_ids))
+
+        return {
+            'doc_ids': docs.ids,
+            'doc_model': 'account.move',
+            'docs': docs,
+            'invoices': invoices,
+        }
+
+    def _collect_invoices(self, cr, ids):
+        """
+        Read the report data of the given invoices.
+
+        Returns:
+            dict: move id -> invoice values with its ``lines`` and ``tax_name``.
+        """
+        params = {'ids': ids, 'lang': self.env.lang or 'en_US'}
+        lines = defaultdict(list)
+        cr.execute(self._LINE_QUERY, params)
+        for line in cr.dictfetchall():
+            line['price_with_tax'] = self.env['account.move']._price_with_tax(line['price_unit'], line['tax_rate'])
+            lines[line['move_id']].append(line)
+
+        cr.execute(self._INVOICE_QUERY, params)
+        invoices = {}
+        for invoice in cr.dictfetchall():
+            invoice['lines'] = lines[invoice['id']]
+            invoice['tax_name'] = invoice['lines'][0]['tax_name'] if invoice['lines'] else None
+            invoices[invoice['id']] = invoice
+        return invoices
@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from odoo import models, api
+
+from ..tools import replica_env
+
+
+class NveReport(models.AbstractModel):
+    """
+    Label data of the NVE barcode report.
+
+    The package names and NVEs are collected with one query, on the read replica
+    when replica routing is enabled, so bulk label printing does not load the
+    packages on the primary.
+    """
+    _name = 'report.ngr_addon.nve_report_template'
+    _description = 'NVE Label Report'
+
+    _LABEL_QUERY = """
+        SELECT rel.stock_picking_id, pkg.name, pkg.nve
+          FROM stock_picking_stock_quant_package_rel rel
+          JOIN stock_quant_package pkg ON pkg.id = rel.stock_quant_package_id
+         WHERE rel.stock_picking_id = ANY(%s)
+      ORDER BY rel.stock_picking_id, pkg.id
+    """
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        docs = self.env['stock.picking'].browse(docids)
+        self.env.flush_all()
+
+        labels = defaultdict(list)
+        with replica_env(self.env) as env:
+            env.cr.execute(self._LABEL_QUERY, [docs.ids])
+            for picking_id, name, nve in env.cr.fetchall():
+                labels[picking_id].append({'name': name, 'nve': nve})
+
+        # Deliveries validated after the replica's last replay are read from the primary
+        missing_ids = [picking_id for picking_id in docs.ids if picking_id not in labels]
+        if missing_ids:
+            self.env.cr.execute(self._LABEL_QUERY, [missing_ids])
+            for picking_id, name, nve in self.env.cr.fetchall():
+                labels[picking_id].append({'name': name, 'nve': nve})
+
+        return {
+            'doc_ids': docs.ids,
+            'doc_model': 'stock.picking',
+            'docs': docs,
+            'labels': labels,
+        }
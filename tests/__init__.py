@@ -0,0 +1,2 @@
+from . import test_label_printer
+from . import test_sequence_audit
@@ -0,0 +1,138 @@
+import socket
+import socketserver
+import threading
+import time
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+class _FakePrinterHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        chunks = []
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+        self.server.received.append(b''.join(chunks))
+
+
+@tagged('post_install', '-at_install')
+class TestLabelPrintSpooler(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _FakePrinterHandler)
+        cls.server.received = []
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+        cls.printer = cls.env['ngr.label.printer'].create({
+            'name': 'Fake Printer',
+            'host': '127.0.0.1',
+            'port': cls.server.server_address[1],
+            'timeout': 2.0,
+            'batch_size': 2,
+            'max_attempts': 2,
+        })
+        picking_type = cls.env.ref('stock.picking_type_out')
+        cls.picking = cls.env['stock.picking'].create({
+            'picking_type_id': picking_type.id,
+            'location_id': picking_type.default_location_src_id.id,
+            'location_dest_id': cls.env.ref('stock.stock_location_customers').id,
+        })
+
+    def setUp(self):
+        super().setUp()
+        self.server.received.clear()
+
+    def _create_jobs(self, count, printer=None):
+        packages = self.env['stock.quant.package'].create([
+            {'name': f'PACK-{index}', 'nve': '3400000000000000%02d' % index} for index in range(count)
+        ])
+        return self.env['ngr.label.print.job'].create([{
+            'printer_id': (printer or self.printer).id,
+            'picking_id': self.picking.id,
+            'package_id': package.id,
+        } for package in packages])
+
+    def _wait_for_connections(self, count):
+        deadline = time.monotonic() + 5
+        while len(self.server.received) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.server.received
+
+    def _unreachable_printer(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        return self.printer.copy({'name': 'Offline Printer', 'port': port})
+
+    def test_jobs_sent_in_batches(self):
+        jobs = self._create_jobs(5)
+
+        self.env['ngr.label.print.job']._cron_process_jobs()
+
+        received = self._wait_for_connections(3)
+        self.assertEqual(sorted(data.count(b'^XA') for data in received), [1, 2, 2],
+                         "5 labels with a batch size of 2 are sent over 3 connections")
+        self.assertEqual(set(jobs.mapped('state')), {'sent'})
+        self.assertTrue(all(jobs.mapped('sent_date')))
+        for job in jobs:
+            self.assertIn(('(00)%s' % job.package_id.nve).encode(), b''.join(received))
+
+    def test_failure_backoff_and_retry(self):
+        job = self._create_jobs(1, printer=self._unreachable_printer())
+        Job = self.env['ngr.label.print.job']
+
+        Job._cron_process_jobs()
+        self.assertEqual(job.state, 'queued')
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job.last_error)
+        self.assertGreater(job.next_attempt_date, fields.Datetime.now())
+
+        # Backing off: the job is not picked up before its next attempt date
+        Job._cron_process_jobs()
+        self.assertEqual(job.attempts, 1)
+
+        job.next_attempt_date = fields.Datetime.now() - timedelta(days=1)
+        Job._cron_process_jobs()
+        self.assertEqual(job.state, 'failed', "The job fails after max_attempts attempts")
+        self.assertEqual(job.attempts, 2)
+
+        job.printer_id = self.printer
+        job.action_retry()
+        self.assertEqual(job.state, 'queued')
+        self.assertEqual(job.attempts, 0)
+        self.assertFalse(job.next_attempt_date)
+
+        Job._cron_process_jobs()
+        self.assertEqual(len(self._wait_for_connections(1)), 1)
+        self.assertEqual(job.state, 'sent')
+
+    def test_retry_leaves_sent_jobs(self):
+        job = self._create_jobs(1)
+        self.env['ngr.label.print.job']._cron_process_jobs()
+        self._wait_for_connections(1)
+        sent_date = job.sent_date
+
+        job.action_retry()
+        self.assertEqual(job.state, 'sent')
+        self.assertEqual(job.sent_date, sent_date)
+
+    def test_packages_without_nve_not_enqueued(self):
+        self.picking.picking_type_id.label_printer_id = self.printer
+        packages = self.env['stock.quant.package'].create([
+            {'name': 'PACK-NVE', 'nve': '340000000000000099'},
+            {'name': 'PACK-NO-NVE'},
+        ])
+        self.picking.result_packages = packages
+
+        jobs = self.env['ngr.label.print.job']._enqueue_picking_labels(self.picking)
+        self.assertEqual(jobs.package_id, packages[0])
@@ -0,0 +1,94 @@
+from datetime import date
+from unittest.mock import patch
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.ngr_addon.models.sequence_audit import _AuditStates
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSequenceAudit(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.journal = cls.company_data['default_journal_sale']
+        cls.journal.invoice_name = 'RE_'
+        # Rows only need real move ids for the findings' move_id
+        cls.moves = cls.env['account.move'].create([
+            {'move_type': 'entry', 'journal_id': cls.company_data['default_journal_misc'].id}
+            for _index in range(6)
+        ])
+
+    def setUp(self):
+        super().setUp()
+        self.Audit = self.env['ngr.sequence.audit']
+        self.audit = self.Audit.create({'name': 'Test Audit'})
+
+    def _row(self, index, year, number, day=1):
+        return {
+            'id': self.moves[index].id,
+            'name': f'RE_{self.journal.code}{year}{number:06d}',
+            'journal_id': self.journal.id,
+            'move_type': 'out_invoice',
+            'date': date(year, 1, day),
+        }
+
+    def _check(self, rows, duplicates=None):
+        states = _AuditStates(self.env)
+        with patch.object(type(self.Audit), '_get_duplicates', return_value=duplicates or {}):
+            self.audit._check_chunk(rows, self.Audit._get_name_patterns(), states)
+        states.save()
+        return self.audit.finding_ids
+
+    def _state(self, year):
+        return self.env['ngr.sequence.audit.state'].search(
+            [('journal_id', '=', self.journal.id), ('year', '=', year)])
+
+    def test_consecutive_numbers(self):
+        findings = self._check([self._row(0, 2025, 1), self._row(1, 2025, 2), self._row(2, 2025, 3)])
+        self.assertFalse(findings)
+        self.assertEqual(self._state(2025).last_number, 3)
+
+    def test_gap_reported_and_filled(self):
+        findings = self._check([self._row(0, 2025, 1), self._row(1, 2025, 4, day=2)])
+        self.assertEqual(len(findings), 1)
+        self.assertRecordValues(findings, [{'kind': 'gap', 'number': 4, 'missing_from': 2, 'missing_to': 3}])
+
+        # A late number splits the gap, the last one resolves it
+        self._check([self._row(2, 2025, 2, day=3)])
+        self.assertRecordValues(findings, [{'missing_from': 3, 'missing_to': 3, 'resolved': False}])
+        self._check([self._row(3, 2025, 3, day=3)])
+        self.assertTrue(findings.resolved)
+
+    def test_duplicate_in_same_run_advances_state(self):
+        rows = [self._row(0, 2025, 4), self._row(1, 2025, 5), self._row(2, 2025, 5), self._row(3, 2025, 6)]
+        duplicates = {rows[1]['name']: [rows[1]['id'], rows[2]['id']]}
+        self.env['ngr.sequence.audit.state'].create({'journal_id': self.journal.id, 'year': 2025, 'last_number': 3})
+
+        findings = self._check(rows, duplicates)
+
+        self.assertEqual(findings.mapped('kind'), ['duplicate', 'duplicate'])
+        self.assertEqual(findings.move_id, self.moves[1:3])
+        self.assertEqual(self._state(2025).last_number, 6)
+
+    def test_out_of_order_date(self):
+        findings = self._check([self._row(0, 2025, 1, day=10), self._row(1, 2025, 2, day=5)])
+        self.assertRecordValues(findings, [{'kind': 'out_of_order', 'number': 2}])
+
+    def test_year_restart_at_one(self):
+        self.env['ngr.sequence.audit.state'].create({'journal_id': self.journal.id, 'year': 2024, 'last_number': 10})
+        findings = self._check([self._row(0, 2025, 1), self._row(1, 2025, 2)])
+        self.assertFalse(findings)
+        self.assertEqual(self._state(2025).last_number, 2)
+
+    def test_year_continues_previous_numbers(self):
+        self.env['ngr.sequence.audit.state'].create({'journal_id': self.journal.id, 'year': 2024, 'last_number': 10})
+        self.assertFalse(self._check([self._row(0, 2025, 11)]))
+
+        findings = self._check([self._row(1, 2026, 14)])
+        self.assertRecordValues(findings, [{'kind': 'gap', 'year': 2026, 'missing_from': 12, 'missing_to': 13}])
+
+    def test_unparsed_name(self):
+        row = dict(self._row(0, 2025, 1), name='INV/2025/00001')
+        self.assertRecordValues(self._check([row]), [{'kind': 'unparsed'}])
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from .replica import open_read_cursor, replica_env, replica_settings
+from .sql import stream_query
@@ -0,0 +1,99 @@
+import logging
+from contextlib import contextmanager
+
+from odoo.tools import str2bool
+
+_logger = logging.getLogger(__name__)
+
+
+def replica_settings(env):
+    """
+    Read the replica routing settings from the system parameters.
+
+    - ``ngr_addon.use_read_replica``: route read-only entry points to the replica (default False)
+    - ``ngr_addon.replica_max_lag``: maximum accepted replication lag in seconds (default 30)
+
+    Returns:
+        tuple: (enabled, max_lag)
+    """
+    params = env['ir.config_parameter'].sudo()
+    enabled = str2bool(params.get_param('ngr_addon.use_read_replica', 'False'))
+    max_lag = float(params.get_param('ngr_addon.replica_max_lag', 30))
+    return enabled, max_lag
+
+
+def _has_replica(registry):
+    """Tell whether a replica is configured (``db_replica_host`` / ``db_replica_port``)."""
+    # Without replica the registry has no readonly pool and readonly cursors use the primary
+    return getattr(registry, '_db_readonly', None) is not None
+
+
+def _is_fresh_replica(cr, max_lag):
+    """
+    Check that the cursor is connected to a replica lagging at most ``max_lag`` seconds.
+
+    A replica that has replayed everything it received is fresh even if the primary
+    has been idle for longer than ``max_lag``, but only while its WAL receiver is
+    streaming: a disconnected replica also replays up to its last received WAL and
+    would look caught up however far behind it is. The receiver status is only
+    visible to roles with ``pg_read_all_stats``; without it the lag is always enforced.
+    """
+    cr.execute("""
+        SELECT pg_is_in_recovery(),
+               pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                   AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'),
+               EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+    """)
+    in_recovery, caught_up, lag = cr.fetchone()
+    if not in_recovery:
+        # The registry fell back to the primary, the caller uses its own cursor instead
+        return False
+    if caught_up or (lag is not None and lag <= max_lag):
+        return True
+    _logger.info("Read replica is %s seconds behind, falling back to the primary", lag)
+    return False
+
+
+def open_read_cursor(registry, settings):
+    """
+    Open a new cursor for read-only work.
+
+    The cursor is opened on the replica when routing is enabled and the replica is
+    fresh enough, on the primary otherwise. The caller must close it.
+
+    Args:
+        registry: The registry of the database.
+        settings (tuple): The result of :func:`replica_settings`.
+    """
+    enabled, max_lag = settings
+    if enabled and _has_replica(registry):
+        cr = registry.cursor(readonly=True)
+        if _is_fresh_replica(cr, max_lag):
+            return cr
+        cr.close()
+    return registry.cursor()
+
+
+@contextmanager
+def replica_env(env):
+    """
+    Yield an environment for read-only lookups.
+
+    When routing is enabled and the replica is fresh enough, the environment runs on a
+    replica cursor; otherwise the given environment (primary, current transaction) is
+    yielded unchanged. Data written in the current transaction is not visible on the
+    replica, so only use this for lookups of committed data.
+    """
+    enabled, max_lag = replica_settings(env)
+    if not enabled or not _has_replica(env.registry):
+        yield env
+        return
+
+    cr = env.registry.cursor(readonly=True)
+    try:
+        if _is_fresh_replica(cr, max_lag):
+            yield env(cr=cr)
+        else:
+            yield env
+    finally:
+        cr.close()
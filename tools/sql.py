@@ -0,0 +1,30 @@
+import uuid
+
+
+def stream_query(cr, query, params=None, chunk_size=2000):
+    """
+    Iterate over the result of a query in fixed-size chunks through a server-side cursor.
+
+    The query is declared as a PostgreSQL cursor inside the current transaction and
+    fetched chunk by chunk, so only ``chunk_size`` rows are ever held in memory.
+
+    Args:
+        cr: The database cursor; the transaction must stay open while iterating.
+        query (str): The SELECT statement.
+        params: The query parameters.
+        chunk_size (int): Number of rows fetched per round trip.
+
+    Yields:
+        list: The rows of the next chunk as dicts.
+    """
+    name = 'ngr_stream_%s' % uuid.uuid4().hex
+    cr.execute('DECLARE %s NO SCROLL CURSOR FOR %s' % (name, query), params)
+    try:
+        while True:
+            cr.execute('FETCH FORWARD %s FROM %s' % (int(chunk_size), name))
+            rows = cr.dictfetchall()
+            if not rows:
+                break
+            yield rows
+    finally:
+        cr.execute('CLOSE %s' % name)